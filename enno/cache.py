@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from collections import OrderedDict
+from threading import RLock
+import re
+import time
+import os
+import zlib
+import hashlib
+import shutil
+
+from .compat import *
+
+
+def write_file(path, data):
+    """write data to path, creating the directory if needed, the data is written
+    to a unique temp file that is then moved to path so readers never see a
+    partial file
+
+    :param path: string, the file path
+    :param data: bytes, the file contents
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another thread made it first
+            if not os.path.isdir(directory):
+                raise
+
+    tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), get_ident())
+    with open(tmp_path, "wb") as fp:
+        fp.write(data)
+    os.rename(tmp_path, path)
+
+
+class LRUCache(object):
+    """A thread safe dict-like cache that holds at most size items, when it is full
+    the least recently used item is removed to make room for the new item
+
+    :Example:
+        c = LRUCache(2)
+        c["foo"] = 1
+        c["bar"] = 2
+        c["foo"]
+        c["che"] = 3 # bar is removed since foo was used more recently
+    """
+    def __init__(self, size=0):
+        """
+        :param size: int, the max items the cache can hold, 0 means unbounded
+        """
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = RLock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                val = self.items.pop(key)
+
+            except KeyError:
+                val = default
+
+            else:
+                # move it to the end since it was just used
+                self.items[key] = val
+
+        return val
+
+    def set(self, key, val):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = val
+            if self.size:
+                while len(self.items) > self.size:
+                    self.items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.items.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __getitem__(self, key):
+        missing = object()
+        val = self.get(key, missing)
+        if val is missing:
+            raise KeyError(key)
+        return val
+
+    def __setitem__(self, key, val):
+        self.set(key, val)
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.items[key]
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+
+class TTLCache(LRUCache):
+    """An LRUCache where each item is only good for ttl seconds after it was set
+
+    :Example:
+        c = TTLCache(ttl=60)
+        c["foo"] = 1
+        c.get("foo") # 1
+        time.sleep(61)
+        c.get("foo") # None
+    """
+    def __init__(self, ttl=0, size=0):
+        """
+        :param ttl: int, how many seconds an item is good for, 0 means nothing is
+            cached
+        :param size: int, the max items the cache can hold, 0 means unbounded
+        """
+        self.ttl = ttl
+        super(TTLCache, self).__init__(size)
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = super(TTLCache, self).get(key)
+            if item is None:
+                val = default
+
+            else:
+                expires, val = item
+                if expires < time.time():
+                    self.items.pop(key, None)
+                    val = default
+
+        return val
+
+    def set(self, key, val):
+        if self.ttl > 0:
+            super(TTLCache, self).set(key, (time.time() + self.ttl, val))
+
+    def pop(self, key, default=None):
+        missing = object()
+        with self.lock:
+            val = self.get(key, missing)
+            super(TTLCache, self).pop(key)
+        return default if val is missing else val
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+
+
+class ContentCache(object):
+    """A thread safe on disk cache of note content, each note's content is saved
+    in its own file under path along with the content's hash and the note's
+    update sequence number (usn) so the cached content is only used while it is
+    still current
+
+    The files of each account are kept in their own directory, see get_account()
+
+    http://dev.evernote.com/doc/reference/Types.html#Struct_Note
+
+    :Example:
+        c = ContentCache("/tmp/enno-content", compress=True)
+        account = c.get_account(interface)
+        c.set(guid, content, usn=10, account=account)
+        c.get(guid, usn=10, account=account) # content
+        c.get(guid, usn=11, account=account) # None, the note changed
+    """
+    USER_ID_REGEX = re.compile(r"(?:^|:)U=([0-9a-fA-F]+)(?::|$)")
+    """finds the user id in an Evernote auth token (eg, S=s1:U=1a2b:E=...)"""
+
+    def __init__(self, path="", compress=False):
+        """
+        :param path: string, the directory the content is saved in, empty means
+            nothing is cached
+        :param compress: bool, True to zlib compress the content that is saved
+        """
+        self.path = path
+        self.compress = compress
+
+    @classmethod
+    def get_content_hash(cls, content):
+        """returns the md5 digest of content, which is how Evernote computes
+        Note.contentHash"""
+        if not isinstance(content, bytes):
+            content = content.encode("utf-8")
+        return hashlib.md5(content).digest()
+
+    @classmethod
+    def get_account(cls, interface):
+        """returns the name of the directory the content of interface's account
+        is cached in, the token itself is never written to disk
+
+        :param interface: EvernoteClient|note store, an EvernoteClient is named by
+            the user id in its token, a note store with a path (eg, mirror.Mirror)
+            is named by the path
+        :returns: string, None if interface doesn't have anything that identifies
+            it between processes, so its content shouldn't be cached
+        """
+        token = getattr(interface, "token", None)
+        if token:
+            m = cls.USER_ID_REGEX.search(token)
+            if m:
+                return "user-{}".format(m.group(1).lower())
+            return "token-{}".format(hashlib.md5(token.encode("utf-8")).hexdigest())
+
+        path = getattr(interface, "path", None)
+        if path and path != ":memory:":
+            path = os.path.abspath(path)
+            return "store-{}".format(hashlib.md5(path.encode("utf-8")).hexdigest())
+
+        return None
+
+    def get_path(self, guid, account):
+        return os.path.join(self.path, account, guid[:2], guid)
+
+    def get(self, guid, content_hash=None, usn=None, account=None):
+        """returns the cached content of the note if it is still current
+
+        :param guid: string, the note's guid
+        :param content_hash: bytes, the note's current contentHash, this is checked
+            first if it is given
+        :param usn: int, the note's current updateSequenceNum
+        :param account: string, see get_account(), nothing is cached without it
+        :returns: string, the content or None if there isn't current content
+        """
+        if not self.path or not account or (content_hash is None and usn is None):
+            return None
+
+        try:
+            with open(self.get_path(guid, account), "rb") as fp:
+                data = fp.read()
+
+            # marker byte, 16 byte md5, usn digits, newline, content
+            marker = data[:1]
+            cached_hash = data[1:17]
+            cached_usn, body = data[17:].split(b"\n", 1)
+            cached_usn = int(cached_usn) if cached_usn else None
+            if marker == b"z":
+                body = zlib.decompress(body)
+            content = body.decode("utf-8")
+
+        except (IOError, OSError, ValueError, zlib.error):
+            return None
+
+        if content_hash is not None:
+            current = cached_hash == content_hash
+
+        else:
+            current = cached_usn is not None and cached_usn == usn
+
+        return content if current else None
+
+    def set(self, guid, content, usn=None, account=None):
+        """
+        :param guid: string, the note's guid
+        :param content: string, the note's ENML
+        :param usn: int, the note's updateSequenceNum when content was fetched
+        :param account: string, see get_account(), nothing is cached without it
+        """
+        if not self.path or not account or content is None:
+            return
+
+        body = content.encode("utf-8") if isinstance(content, unicode) else content
+        data = [
+            b"z" if self.compress else b"p",
+            self.get_content_hash(body),
+            b"" if usn is None else "{}".format(int(usn)).encode("ascii"),
+            b"\n",
+            zlib.compress(body) if self.compress else body,
+        ]
+        write_file(self.get_path(guid, account), b"".join(data))
+
+    def pop(self, guid, account=None):
+        if self.path and account:
+            try:
+                os.remove(self.get_path(guid, account))
+            except OSError:
+                pass
+
+    def clear(self):
+        if self.path and os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+
+class ConversionCache(LRUCache):
+    """An LRUCache of converted markup (eg, ENML converted to plain text) keyed by
+    a hash of the markup and how it was converted, so the same markup is only
+    converted once. If path is set the conversions are also saved on disk, where
+    they are shared by every process and survive restarts
+
+    Each value is a (name, text) tuple, name being the format of text (eg, plain),
+    they are saved on disk as the name and the utf-8 text so nothing read from the
+    directory is ever unpickled
+
+    :Example:
+        c = ConversionCache(1000, "/tmp/enno-conversions")
+        key = c.get_key(enml, "ENML", "plain")
+        c.set(key, ("plain", plain))
+        c.get(key) # ("plain", plain)
+    """
+    def __init__(self, size=0, path=""):
+        """
+        :param size: int, the max conversions held in memory, 0 means none are
+        :param path: string, the directory conversions are saved in, empty means
+            they aren't saved
+        """
+        self.path = path
+        super(ConversionCache, self).__init__(size)
+
+    @property
+    def enabled(self):
+        return bool(self.size or self.path)
+
+    @classmethod
+    def get_key(cls, markup, *parts):
+        """returns the hex md5 digest of markup and everything about how it is
+        being converted
+
+        :param markup: string, the markup being converted
+        :param *parts: anything that changes the conversion (eg, the format)
+        :returns: string
+        """
+        h = hashlib.md5()
+        for part in parts:
+            h.update("{}\0".format(part).encode("utf-8"))
+        h.update(markup.encode("utf-8") if isinstance(markup, unicode) else markup)
+        return h.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key, default=None):
+        missing = object()
+        val = missing
+        if self.size:
+            val = super(ConversionCache, self).get(key, missing)
+
+        if val is missing and self.path:
+            try:
+                with open(self.get_path(key), "rb") as fp:
+                    name, text = fp.read().split(b"\n", 1)
+                val = (name.decode("utf-8"), text.decode("utf-8"))
+
+            except (IOError, OSError, ValueError):
+                # ValueError covers files without a name and undecodable bytes
+                pass
+
+            else:
+                if self.size:
+                    super(ConversionCache, self).set(key, val)
+
+        return default if val is missing else val
+
+    def set(self, key, val):
+        if self.size:
+            super(ConversionCache, self).set(key, val)
+
+        if self.path:
+            name, text = val
+            write_file(
+                self.get_path(key),
+                name.encode("utf-8") + b"\n" + text.encode("utf-8")
+            )
+
+    def pop(self, key, default=None):
+        val = self.get(key, default)
+        super(ConversionCache, self).pop(key)
+        if self.path:
+            try:
+                os.remove(self.get_path(key))
+            except OSError:
+                pass
+        return val
+
+    def clear(self):
+        super(ConversionCache, self).clear()
+        if self.path and os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
@@ -22,6 +22,9 @@ if is_py2:
     from SimpleHTTPServer import SimpleHTTPRequestHandler
     from BaseHTTPServer import HTTPServer
     import urlparse
+    import Queue as queue
+    from thread import get_ident
+    from HTMLParser import HTMLParser
 
 
 elif is_py3:
@@ -30,6 +33,9 @@ elif is_py3:
 
     from http.server import HTTPServer, SimpleHTTPRequestHandler
     from urllib import parse as urlparse
+    import queue
+    from threading import get_ident
+    from html.parser import HTMLParser
 
 
     # ripped from six https://bitbucket.org/gutworth/six
@@ -32,3 +32,38 @@ SANDBOX_ACCESS_TOKEN = os.environ.get("ENNO_SANDBOX_ACCESS_TOKEN", "")
 """This is a valid access token for the sandbox, this is more to make it easier for
 testing while also making it easy to seemlessly switch to production"""
 
+LIST_CACHE_TTL = int(os.environ.get("ENNO_LIST_CACHE_TTL", 60))
+"""How many seconds the listNotebooks() and listTags() results are cached for,
+set to 0 to turn the cache off"""
+
+QUERY_CACHE_SIZE = int(os.environ.get("ENNO_QUERY_CACHE_SIZE", 0))
+"""How many findNotesMetadata() results are cached, the cache is thrown away
+whenever the account's update count changes, set to 0 to turn the cache off"""
+
+QUERY_CACHE_INTERVAL = float(os.environ.get("ENNO_QUERY_CACHE_INTERVAL", 0))
+"""How many seconds can pass between checking the account's update count, the
+default of 0 checks it every time a cached result is used so results are always
+current. This is opt-in, setting it to something like 30 returns cached results
+used within that many seconds of the last check without asking Evernote anything,
+which means changes made by other clients can go unnoticed for that long (changes
+made through enno always throw the cache away)"""
+
+CONTENT_CACHE_PATH = os.environ.get("ENNO_CONTENT_CACHE_PATH", "")
+"""The directory note content is cached in, the cached content of a note is used
+until the note changes, leave empty to turn the cache off"""
+
+CONTENT_CACHE_COMPRESS = bool(int(os.environ.get("ENNO_CONTENT_CACHE_COMPRESS", 0)))
+"""Set to 1 to zlib compress the content in the content cache"""
+
+CONVERSION_CACHE_SIZE = int(os.environ.get("ENNO_CONVERSION_CACHE_SIZE", 0))
+"""How many conversions (eg, ENML to plain text) are kept in memory so the same
+markup isn't converted again, set to 0 to turn the memory cache off"""
+
+CONVERSION_CACHE_PATH = os.environ.get("ENNO_CONVERSION_CACHE_PATH", "")
+"""The directory conversions are saved in so they can be reused by other processes,
+leave empty to not save conversions on disk"""
+
+PARSER = os.environ.get("ENNO_PARSER", "")
+"""The BeautifulSoup parser used to parse HTML and ENML, empty means python's
+html.parser. Set to lxml to use lxml if it is installed, it is faster but the
+plain text of malformed html (eg, unclosed <p> tags) can come out differently"""
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+import os
+import json
+import bisect
+import codecs
+
+from .compat import *
+from .search import parse, Tokenizer
+from .utils import ENML
+
+
+class Segment(object):
+    """A group of indexed notes, each field maps a token to the positions that
+    token appears at in each note (doc) that has it
+
+    https://en.wikipedia.org/wiki/Inverted_index
+    """
+    fields = ["title", "content"]
+
+    def __init__(self, docs=None, postings=None):
+        # docid -> guid
+        self.docs = docs or {}
+        # field -> token -> docid -> [positions]
+        self.postings = postings or dict((field, {}) for field in self.fields)
+        self._tokens = {}
+
+    @classmethod
+    def load(cls, path):
+        with codecs.open(path, encoding="utf-8") as fp:
+            d = json.load(fp)
+
+        # json turns the int keys into strings
+        docs = dict((int(docid), guid) for docid, guid in d["docs"].items())
+        postings = {}
+        for field, tokens in d["postings"].items():
+            postings[field] = {}
+            for token, positions in tokens.items():
+                postings[field][token] = dict((int(docid), ps) for docid, ps in positions.items())
+        return cls(docs, postings)
+
+    def save(self, path):
+        tmp_path = "{}.tmp".format(path)
+        with codecs.open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({"docs": self.docs, "postings": self.postings}, fp)
+        os.rename(tmp_path, path)
+
+    def add(self, docid, guid, texts):
+        """
+        :param docid: int, the internal id of the note
+        :param guid: string, the note's guid
+        :param texts: dict, field -> list of tokens
+        """
+        self.docs[docid] = guid
+        for field, tokens in texts.items():
+            postings = self.postings[field]
+            for position, token in enumerate(tokens):
+                postings.setdefault(token, {}).setdefault(docid, []).append(position)
+        self._tokens = {}
+
+    def get_tokens(self, field):
+        """returns the sorted tokens of field, used for prefix (foo*) searches"""
+        if field not in self._tokens:
+            self._tokens[field] = sorted(self.postings[field].keys())
+        return self._tokens[field]
+
+    def get_docs(self, field, tokens, prefix=False):
+        """find all the docs where tokens appear next to each other in field
+
+        :param field: string, title or content
+        :param tokens: list, the tokens, more than one token is a phrase
+        :param prefix: bool, True if the last token is a prefix (eg foo*)
+        :returns: set, the matching docids
+        """
+        postings = self.postings[field]
+        last = tokens[-1]
+        if prefix:
+            lasts = []
+            ts = self.get_tokens(field)
+            i = bisect.bisect_left(ts, last)
+            while i < len(ts) and ts[i].startswith(last):
+                lasts.append(ts[i])
+                i += 1
+
+        else:
+            lasts = [last] if last in postings else []
+
+        docids = set()
+        for token in lasts:
+            docids.update(postings[token])
+
+        for token in tokens[:-1]:
+            docids &= set(postings.get(token, {}))
+
+        if len(tokens) > 1:
+            # make sure the tokens are next to each other
+            phrase_docids = set()
+            for docid in docids:
+                starts = set(postings[tokens[0]][docid])
+                for offset, token in enumerate(tokens[1:-1], 1):
+                    starts &= set(p - offset for p in postings[token][docid])
+
+                offset = len(tokens) - 1
+                for token in lasts:
+                    if starts & set(p - offset for p in postings[token].get(docid, [])):
+                        phrase_docids.add(docid)
+                        break
+            docids = phrase_docids
+
+        return docids
+
+
+class Index(object):
+    """A local inverted index of the title and plain text of notes, this can answer
+    plain word, any:, intitle: and negated searches without Evernote
+
+    Each commit writes the notes added since the last commit to a new segment
+    file in path, merge() combines all the segments into one
+
+    :Example:
+        index = Index("/tmp/enno-index")
+        for n in Note.query.all():
+            index.add(n)
+        index.commit()
+        guids = index.search(Note.query.in_note("foo").nin_title("bar"))
+    """
+    tokenizer_class = Tokenizer
+
+    def __init__(self, path):
+        self.path = path
+        self.tokenizer = self.tokenizer_class()
+        self.segments = {}
+        self.deleted = set()
+        self.next_docid = 1
+        self.generation = 0
+        self.buffer = Segment()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        manifest_path = self.get_manifest_path()
+        if os.path.isfile(manifest_path):
+            with codecs.open(manifest_path, encoding="utf-8") as fp:
+                manifest = json.load(fp)
+
+            self.next_docid = manifest["next_docid"]
+            self.generation = manifest["generation"]
+            self.deleted = set(manifest["deleted"])
+            for name in manifest["segments"]:
+                self.segments[name] = Segment.load(os.path.join(path, name))
+
+        # guid -> docid and docid -> guid of every live note
+        self.guids = {}
+        self.docs = {}
+        for segment in self.get_segments():
+            for docid, guid in segment.docs.items():
+                if docid not in self.deleted:
+                    self.guids[guid] = docid
+                    self.docs[docid] = guid
+
+    def get_manifest_path(self):
+        return os.path.join(self.path, "index.json")
+
+    def get_segments(self):
+        return list(self.segments.values()) + [self.buffer]
+
+    def add(self, note):
+        """Add or replace a note in the index, the note needs its content
+
+        :param note: model.Note|evernote Note, the note to index
+        """
+        content = note.content
+        if content and hasattr(note, "plain"):
+            plain = note.plain
+
+        else:
+            plain = ENML(content).plain() if content else ""
+
+        self.remove(note.guid)
+
+        docid = self.next_docid
+        self.next_docid += 1
+        self.buffer.add(docid, note.guid, {
+            "title": self.tokenizer.tokens(note.title),
+            "content": self.tokenizer.tokens(plain),
+        })
+        self.guids[note.guid] = docid
+        self.docs[docid] = note.guid
+
+    def remove(self, guid):
+        docid = self.guids.pop(guid, None)
+        if docid is not None:
+            self.docs.pop(docid, None)
+            self.deleted.add(docid)
+
+    def commit(self):
+        """write everything added since the last commit to disk"""
+        if self.buffer.docs:
+            self.generation += 1
+            name = "segment-{}.json".format(self.generation)
+            self.buffer.save(os.path.join(self.path, name))
+            self.segments[name] = self.buffer
+            self.buffer = Segment()
+        self.write_manifest()
+
+    def write_manifest(self):
+        manifest_path = self.get_manifest_path()
+        tmp_path = "{}.tmp".format(manifest_path)
+        with codecs.open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump({
+                "next_docid": self.next_docid,
+                "generation": self.generation,
+                "deleted": list(self.deleted),
+                "segments": list(self.segments.keys()),
+            }, fp)
+        os.rename(tmp_path, manifest_path)
+
+    def merge(self):
+        """combine all the segments into one segment without the removed notes"""
+        self.commit()
+        merged = Segment()
+        for segment in self.segments.values():
+            for docid, guid in segment.docs.items():
+                if docid not in self.deleted:
+                    merged.docs[docid] = guid
+
+            for field, tokens in segment.postings.items():
+                for token, positions in tokens.items():
+                    for docid, ps in positions.items():
+                        if docid not in self.deleted:
+                            merged.postings[field].setdefault(token, {})[docid] = ps
+
+        old_names = list(self.segments.keys())
+        self.segments = {}
+        self.deleted = set()
+        self.buffer = merged
+        self.commit()
+        for name in old_names:
+            os.remove(os.path.join(self.path, name))
+
+    def get_docs(self, term):
+        """returns the live docids that match term, ignoring whether it is negated"""
+        fields = ["title"] if term.field == "intitle" else ["title", "content"]
+        value = term.value
+        prefix = value.endswith("*")
+        tokens = self.tokenizer.tokens(value)
+        docids = set()
+        if tokens:
+            for segment in self.get_segments():
+                for field in fields:
+                    docids |= segment.get_docs(field, tokens, prefix=prefix)
+        return docids - self.deleted
+
+    def search(self, query):
+        """find the notes that match query
+
+        :param query: NoteQuery|string, the query or its search grammar words
+        :returns: list, the guids of the matching notes
+        """
+        words = query if isinstance(query, basestring) else query.note_filter.words
+        terms = parse(words)
+        match_any = any(t.field == "any" and not t.value for t in terms)
+
+        docids = None
+        # negated terms are subtracted at the end so the set of every docid is
+        # only built when a negated term is one of the any: alternatives
+        excluded = set()
+        any_docids = None
+        for term in terms:
+            if term.field == "any" and not term.value:
+                continue
+
+            if term.field not in set(["", "any", "intitle"]):
+                raise ValueError("Search term {} is not supported by the index".format(term))
+
+            term_docids = self.get_docs(term)
+            if match_any or (term.field == "any" and not term.negated):
+                if term.negated:
+                    term_docids = set(self.docs) - term_docids
+                any_docids = term_docids if any_docids is None else any_docids | term_docids
+
+            elif term.negated:
+                excluded |= term_docids
+
+            else:
+                docids = term_docids if docids is None else docids & term_docids
+
+        if any_docids is not None:
+            docids = any_docids if docids is None else docids & any_docids
+
+        if docids is None:
+            docids = set(self.docs)
+
+        return [self.docs[docid] for docid in sorted(docids - excluded)]
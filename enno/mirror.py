@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+import sqlite3
+import pickle
+from threading import RLock
+
+import evernote.edam.notestore.ttypes as NoteStore
+from evernote.edam.type.ttypes import NoteSortOrder
+from evernote.edam.error.ttypes import EDAMNotFoundException
+
+from .compat import *
+from .sync import Replica
+from .search import Tokenizer, parse, parse_timestamp
+from .query import NotebookQuery, TagQuery
+from .utils import Plain, ENML
+
+
+class Mirror(Replica):
+    """A Replica that keeps the notes, notebooks and tags in SQLite
+
+    It also has the NoteStore methods the queries use, so any query can be run
+    against it instead of against Evernote
+
+    :Example:
+        m = Mirror("/tmp/enno.sqlite")
+        Sync(m, content=True).run()
+        for n in Note.query.use(m).in_title("foo").get():
+            print(n.title)
+
+    https://docs.python.org/3/library/sqlite3.html
+    """
+    sort_fields = {
+        NoteSortOrder.CREATED: "created",
+        NoteSortOrder.UPDATED: "updated",
+        NoteSortOrder.UPDATE_SEQUENCE_NUMBER: "usn",
+        NoteSortOrder.TITLE: "title",
+    }
+
+    tokenizer_class = Tokenizer
+    """the words columns are split the same way search.Predicate splits them so
+    the mirror and the predicate agree on what a word is"""
+
+    @property
+    def usn(self):
+        return self._get_state("usn")
+
+    @usn.setter
+    def usn(self, v):
+        self._set_state("usn", v)
+
+    @property
+    def last_sync(self):
+        return self._get_state("last_sync")
+
+    @last_sync.setter
+    def last_sync(self, v):
+        self._set_state("last_sync", v)
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.lock = RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.tokenizer = self.tokenizer_class()
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                );
+
+                CREATE TABLE IF NOT EXISTS notes (
+                    guid TEXT PRIMARY KEY,
+                    title TEXT,
+                    notebook_guid TEXT,
+                    created INTEGER,
+                    updated INTEGER,
+                    usn INTEGER,
+                    active INTEGER,
+                    content_hash BLOB,
+                    content TEXT,
+                    plain TEXT,
+                    title_words TEXT,
+                    plain_words TEXT,
+                    struct BLOB
+                );
+                CREATE INDEX IF NOT EXISTS notes_notebook_guid ON notes (notebook_guid);
+                CREATE INDEX IF NOT EXISTS notes_created ON notes (created);
+                CREATE INDEX IF NOT EXISTS notes_updated ON notes (updated);
+                CREATE INDEX IF NOT EXISTS notes_title ON notes (title);
+
+                CREATE TABLE IF NOT EXISTS note_tags (
+                    note_guid TEXT,
+                    tag_guid TEXT,
+                    PRIMARY KEY (note_guid, tag_guid)
+                );
+                CREATE INDEX IF NOT EXISTS note_tags_tag_guid ON note_tags (tag_guid);
+
+                CREATE TABLE IF NOT EXISTS notebooks (
+                    guid TEXT PRIMARY KEY,
+                    name TEXT,
+                    struct BLOB
+                );
+
+                CREATE TABLE IF NOT EXISTS tags (
+                    guid TEXT PRIMARY KEY,
+                    name TEXT,
+                    struct BLOB
+                );
+            """)
+
+            columns = set(r[1] for r in self.execute("PRAGMA table_info(notes)"))
+            if "title_words" not in columns:
+                # mirrors created before notes were searched by word
+                self.execute("ALTER TABLE notes ADD COLUMN title_words TEXT")
+                self.execute("ALTER TABLE notes ADD COLUMN plain_words TEXT")
+                for guid, title, plain in self.execute("SELECT guid, title, plain FROM notes"):
+                    self.execute(
+                        "UPDATE notes SET title_words = ?, plain_words = ? WHERE guid = ?",
+                        (self._words(title), self._words(plain), guid)
+                    )
+                self.connection.commit()
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _get_state(self, key):
+        rows = self.execute("SELECT value FROM state WHERE key = ?", (key,))
+        return rows[0][0] if rows else 0
+
+    def _set_state(self, key, v):
+        self.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, v))
+
+    def _dumps(self, struct):
+        return sqlite3.Binary(pickle.dumps(struct, pickle.HIGHEST_PROTOCOL))
+
+    def _loads(self, blob):
+        return pickle.loads(bytes(blob))
+
+    def _words(self, text):
+        """the tokens of text padded with spaces so a LIKE can match whole words"""
+        if text is None:
+            return None
+        return " {} ".format(" ".join(self.tokenizer.tokens(text)))
+
+    def get_content_hash(self, guid):
+        rows = self.execute(
+            "SELECT content_hash FROM notes WHERE guid = ? AND content IS NOT NULL",
+            (guid,)
+        )
+        return bytes(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def save_notes(self, notes):
+        with self.lock:
+            for note in notes:
+                content = note.content
+                note.content = None
+                plain = Plain(ENML(content).plain()) if content else None
+
+                if content is None:
+                    # keep the content we already have if it hasn't changed
+                    rows = self.execute(
+                        "SELECT content, plain FROM notes WHERE guid = ? AND content_hash = ?",
+                        (note.guid, note.contentHash)
+                    )
+                    if rows:
+                        content, plain = rows[0]
+
+                self.execute(
+                    """INSERT OR REPLACE INTO notes
+                    (guid, title, notebook_guid, created, updated, usn, active,
+                    content_hash, content, plain, title_words, plain_words, struct)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        note.guid,
+                        note.title,
+                        note.notebookGuid,
+                        note.created,
+                        note.updated,
+                        note.updateSequenceNum,
+                        0 if note.active is False else 1,
+                        note.contentHash,
+                        content,
+                        plain,
+                        self._words(note.title),
+                        self._words(plain),
+                        self._dumps(note),
+                    )
+                )
+                note.content = content
+
+                self.execute("DELETE FROM note_tags WHERE note_guid = ?", (note.guid,))
+                for tag_guid in note.tagGuids or []:
+                    self.execute(
+                        "INSERT INTO note_tags (note_guid, tag_guid) VALUES (?, ?)",
+                        (note.guid, tag_guid)
+                    )
+
+    def expunge_notes(self, guids):
+        with self.lock:
+            for guid in guids:
+                self.execute("DELETE FROM notes WHERE guid = ?", (guid,))
+                self.execute("DELETE FROM note_tags WHERE note_guid = ?", (guid,))
+
+    def _save_structs(self, table, structs):
+        with self.lock:
+            for struct in structs:
+                self.execute(
+                    "INSERT OR REPLACE INTO {} (guid, name, struct) VALUES (?, ?, ?)".format(table),
+                    (struct.guid, Plain(struct.name).lower(), self._dumps(struct))
+                )
+
+    def _expunge_structs(self, table, guids):
+        with self.lock:
+            for guid in guids:
+                self.execute("DELETE FROM {} WHERE guid = ?".format(table), (guid,))
+
+    def save_notebooks(self, notebooks):
+        self._save_structs("notebooks", notebooks)
+        NotebookQuery.clear_list(self)
+
+    def expunge_notebooks(self, guids):
+        self._expunge_structs("notebooks", guids)
+        NotebookQuery.clear_list(self)
+
+    def save_tags(self, tags):
+        self._save_structs("tags", tags)
+        TagQuery.clear_list(self)
+
+    def expunge_tags(self, guids):
+        self._expunge_structs("tags", guids)
+        TagQuery.clear_list(self)
+
+    def clear(self):
+        with self.lock:
+            for table in ["state", "notes", "note_tags", "notebooks", "tags"]:
+                self.execute("DELETE FROM {}".format(table))
+        NotebookQuery.clear_list(self)
+        TagQuery.clear_list(self)
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _get_struct(self, table, guid):
+        rows = self.execute("SELECT struct FROM {} WHERE guid = ?".format(table), (guid,))
+        if not rows:
+            raise EDAMNotFoundException(identifier=guid)
+        return self._loads(rows[0][0])
+
+    def _compile_filter(self, note_filter):
+        """Convert the NoteFilter into a SQL where clause
+
+        :returns: tuple, (where, params)
+        """
+        where = []
+        params = []
+
+        if not note_filter.inactive:
+            where.append("notes.active = 1")
+
+        if note_filter.notebookGuid:
+            where.append("notes.notebook_guid = ?")
+            params.append(note_filter.notebookGuid)
+
+        for tag_guid in note_filter.tagGuids or []:
+            where.append(
+                "EXISTS (SELECT 1 FROM note_tags WHERE note_guid = notes.guid AND tag_guid = ?)"
+            )
+            params.append(tag_guid)
+
+        terms = parse(note_filter.words)
+        match_any = any(t.field == "any" and not t.value for t in terms)
+        any_where = []
+        any_params = []
+        for term in terms:
+            if term.field == "any" and not term.value:
+                continue
+
+            compiled = self._compile_term(term)
+            if compiled is None:
+                continue
+
+            clause, clause_params = compiled
+            if match_any or (term.field == "any" and not term.negated):
+                any_where.append(clause)
+                any_params.extend(clause_params)
+
+            else:
+                where.append(clause)
+                params.extend(clause_params)
+
+        if any_where:
+            where.append("({})".format(" OR ".join(any_where)))
+            params.extend(any_params)
+
+        return " AND ".join(where) or "1", params
+
+    def _escape(self, value):
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    def _compile_term(self, term):
+        """Convert one search Term into a SQL clause, words match the same way
+        they do in search.Predicate, so intitle:cat won't match "concatenate"
+
+        :returns: tuple, (clause, params), or None if the term can't match anything
+            (eg, punctuation)
+        """
+        field = term.field
+        value = term.value
+        prefix = value.endswith("*")
+        params = []
+
+        if field in set(["", "any", "intitle"]):
+            tokens = self.tokenizer.tokens(value)
+            if not tokens:
+                return None
+
+            # the words columns are " tok1 tok2 " so padding the phrase with spaces
+            # only matches whole words, a prefix search leaves the last word open
+            like = "% {}{}".format(self._escape(" ".join(tokens)), "%" if prefix else " %")
+            if field == "intitle":
+                clause = "notes.title_words LIKE ? ESCAPE '\\'"
+                params.append(like)
+
+            else:
+                clause = " ".join([
+                    "(notes.title_words LIKE ? ESCAPE '\\'",
+                    "OR notes.plain_words LIKE ? ESCAPE '\\')",
+                ])
+                params.extend([like, like])
+
+        elif field in set(["notebook", "tag"]):
+            name = Plain(value).lower()
+            if prefix:
+                name_clause = "name LIKE ? ESCAPE '\\'"
+                params.append("{}%".format(self._escape(name[:-1])))
+
+            else:
+                name_clause = "name = ?"
+                params.append(name)
+
+            if field == "notebook":
+                clause = "notes.notebook_guid IN (SELECT guid FROM notebooks WHERE {})".format(
+                    name_clause
+                )
+
+            else:
+                clause = " ".join([
+                    "EXISTS (SELECT 1 FROM note_tags JOIN tags ON tags.guid = note_tags.tag_guid",
+                    "WHERE note_tags.note_guid = notes.guid AND tags.{})".format(name_clause),
+                ])
+
+        elif field in set(["created", "updated"]):
+            # created:X means on or after X and -created:X means before X, so the
+            # negation is already handled
+            op = "<" if term.negated else ">="
+            return "notes.{} {} ?".format(field, op), [parse_timestamp(value)]
+
+        else:
+            raise ValueError("Search term {} is not supported".format(term))
+
+        if term.negated:
+            clause = "NOT {}".format(clause)
+
+        return clause, params
+
+    def _compile_order(self, note_filter):
+        field = self.sort_fields.get(note_filter.order, "updated")
+        direction = "ASC" if note_filter.ascending else "DESC"
+        return "notes.{} {}, notes.guid {}".format(field, direction, direction)
+
+    def findNotesMetadata(self, note_filter, offset, maxNotes, resultSpec):
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_findNotesMetadata
+        where, params = self._compile_filter(note_filter)
+        total = self.execute("SELECT COUNT(*) FROM notes WHERE {}".format(where), params)[0][0]
+        rows = self.execute(
+            "SELECT struct FROM notes WHERE {} ORDER BY {} LIMIT ? OFFSET ?".format(
+                where,
+                self._compile_order(note_filter)
+            ),
+            params + [maxNotes, offset]
+        )
+
+        spec = resultSpec or NoteStore.NotesMetadataResultSpec()
+        notes = []
+        for (blob,) in rows:
+            note = self._loads(blob)
+            notes.append(NoteStore.NoteMetadata(
+                guid=note.guid,
+                title=note.title if spec.includeTitle else None,
+                contentLength=note.contentLength if spec.includeContentLength else None,
+                created=note.created if spec.includeCreated else None,
+                updated=note.updated if spec.includeUpdated else None,
+                deleted=note.deleted if spec.includeDeleted else None,
+                updateSequenceNum=note.updateSequenceNum if spec.includeUpdateSequenceNum else None,
+                notebookGuid=note.notebookGuid if spec.includeNotebookGuid else None,
+                tagGuids=note.tagGuids if spec.includeTagGuids else None,
+                attributes=note.attributes if spec.includeAttributes else None,
+            ))
+
+        return NoteStore.NotesMetadataList(
+            startIndex=offset,
+            totalNotes=total,
+            notes=notes,
+        )
+
+    def findNoteCounts(self, note_filter, withTrash):
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_findNoteCounts
+        where, params = self._compile_filter(note_filter)
+        rows = self.execute(
+            "SELECT notebook_guid, COUNT(*) FROM notes WHERE {} GROUP BY notebook_guid".format(where),
+            params
+        )
+        return NoteStore.NoteCollectionCounts(notebookCounts=dict(rows))
+
+    def getNote(self, guid, withContent, withResourcesData, withResourcesRecognition,
+                withResourcesAlternateData):
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNote
+        note = self._get_struct("notes", guid)
+        if withContent:
+            note.content = self.getNoteContent(guid)
+        return note
+
+    def getNoteContent(self, guid):
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNoteContent
+        rows = self.execute("SELECT content FROM notes WHERE guid = ?", (guid,))
+        if not rows:
+            raise EDAMNotFoundException(identifier=guid)
+        return rows[0][0]
+
+    def listNotebooks(self):
+        return [self._loads(r[0]) for r in self.execute("SELECT struct FROM notebooks")]
+
+    def getNotebook(self, guid):
+        return self._get_struct("notebooks", guid)
+
+    def listTags(self):
+        return [self._loads(r[0]) for r in self.execute("SELECT struct FROM tags")]
+
+    def getTag(self, guid):
+        return self._get_struct("tags", guid)
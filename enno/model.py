@@ -16,6 +16,12 @@ from .interface import get_interface
 from .decorators import classproperty
 from .compat import *
 from .utils import Plain, HTML, ENML, TypeList
+from .cache import ContentCache
+from . import environ
+
+
+content_cache = ContentCache(environ.CONTENT_CACHE_PATH, environ.CONTENT_CACHE_COMPRESS)
+"""Process wide on disk cache of note content"""
 
 
 class Enbase(object):
@@ -50,10 +56,31 @@ class Enbase(object):
 
     @property
     def note_store(self):
-        ret = self.interface.get_note_store()
-        self.__dict__["note_store"] = ret
+        ret = self.__dict__.get("_note_store")
+        if ret is None:
+            ret = self.interface.get_note_store()
+            self.__dict__["_note_store"] = ret
         return ret
 
+    def use(self, note_store):
+        """Make any requests this instance needs (eg, hydrating or fetching its
+        notebook) with note_store instead of Evernote
+
+        :param note_store: anything with the NoteStore methods (eg, mirror.Mirror)
+        :returns: self, for chaining
+        """
+        self.__dict__["_store"] = note_store
+        self.__dict__["_note_store"] = note_store
+        return self
+
+    def get_query(self, model_class):
+        """returns model_class.query using the same note store as this instance"""
+        query = model_class.query
+        store = self.__dict__.get("_store")
+        if store is not None:
+            query.use(store)
+        return query
+
     @classmethod
     def convert_timestamp(self, ts):
         """I'm not sure what thrift is doing here, the type is I64 but it
@@ -70,7 +97,8 @@ class Enbase(object):
             ret = datetime.datetime.utcfromtimestamp(ts)
         return ret
 
-    def convert_key(self, k):
+    @classmethod
+    def convert_key(cls, k):
         """Evernote uses camelcase for variable names, which is very unpythonic,
         so this will convert foo_bar to fooBar to match evernote so fooBar and
         foo_bar will both work
@@ -153,6 +181,7 @@ class Struct(Enbase):
             except EDAMUserException as e:
                 if e.errorCode == 10:
                     # data conflict, this probably already exists
+                    self.query_class.clear_list(self.interface)
                     struct = self.query.is_name(self.name).one()
                     if struct is None:
                         raise
@@ -191,6 +220,9 @@ class Note(Enbase):
 
     struct_class = EvernoteNote
 
+    struct_fields = frozenset(vars(EvernoteNote()))
+    """All the fields a full note has"""
+
     @property
     def created(self):
         return self.convert_timestamp(self.__getattr__("created"))
@@ -205,7 +237,7 @@ class Note(Enbase):
         if self._notebook is None:
             guid = self.notebookGuid
             if guid:
-                self._notebook = self.notebook_class.query.is_guid(guid).one()
+                self._notebook = self.get_query(self.notebook_class).is_guid(guid).one()
         return self._notebook
 
     @notebook.setter
@@ -227,7 +259,7 @@ class Note(Enbase):
             self._tags = TypeList(self.tag_class.assure_instance)
             guids = self.tagGuids
             if guids:
-                self._tags.extend(self.tag_class.query.in_guid(*guids).get())
+                self._tags.extend(self.get_query(self.tag_class).in_guid(*guids).get())
         return self._tags
 
     @tags.setter
@@ -252,7 +284,8 @@ class Note(Enbase):
     @plain.setter
     def plain(self, v):
         p = Plain(v)
-        self.content = p.enml()
+        # the content is uploaded as is so don't waste bytes on indentation
+        self.content = p.enml(pretty=False)
 
     @property
     def html(self):
@@ -261,12 +294,22 @@ class Note(Enbase):
     @html.setter
     def html(self, v):
         p = HTML(v)
-        self.content = p.enml()
+        # the content is uploaded as is so don't waste bytes on indentation
+        self.content = p.enml(pretty=False)
 
     @property
     def content(self):
-        s = self.note.content
-        return ENML(s) if s else None
+        s = self.__getattr__("content")
+        if not s:
+            return None
+
+        # hold on to the ENML so its parsed markup is reused (eg, by .plain and
+        # .html) until the content changes
+        content = self.__dict__.get("_content")
+        if content is None or content[0] is not s:
+            content = (s, ENML(s))
+            self._content = content
+        return content[1]
 
     @content.setter
     def content(self, v):
@@ -275,6 +318,9 @@ class Note(Enbase):
     def __init__(self, struct=None, **kwargs):
         self._notebook = None
         self._tags = None
+        # the fields the struct was fetched with (eg, NoteQuery.select()), None
+        # means any field could be missing
+        self._fields = None
         if struct:
             self.struct = struct
             self._hydrated = False
@@ -285,16 +331,92 @@ class Note(Enbase):
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def _set_fields(self, fields):
+        self._fields = fields
+        if fields >= self.struct_fields:
+            self._hydrated = True
+
+    def _missing_fields(self):
+        """returns the set of fields that haven't been fetched yet"""
+        if self._hydrated:
+            return set()
+        return set(self.struct_fields - (self._fields or set()))
+
     def _hydrate(self):
-        # avoid infinite recurrsion because self.guid will trigger __getattr__
-        # again
-        hydrated = self._hydrated
-        self._hydrated = True
-        guid = self.guid
-        if self.guid:
-            if not hydrated:
-                self.struct = self.note_store.getNote(guid, True, False, False, False)
+        """Load the full note, content included"""
+        struct = self.struct
+        if not self._hydrated and struct.guid:
+            if content_cache.path:
+                # the metadata says whether the cached content can be used
+                self._hydrate_metadata()
+                self._hydrate_content()
+
+            else:
+                # python evernote doesn't have getNoteWithResultSpec so this uses
+                # the deprecated method:
+                # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNote
+                self.struct = self.note_store.getNote(struct.guid, True, False, False, False)
+        self._set_fields(set(self.struct_fields))
+        return self.struct
+
+    def _hydrate_metadata(self, note_store=None):
+        """Load every field of the note except the content, any content the note
+        already has is kept"""
+        struct = self.struct
+        fields = set(self._fields or [])
+        if struct.guid:
+            content = getattr(struct, "content", None)
+            if note_store is None:
+                note_store = self.note_store
+            # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNote
+            self.struct = note_store.getNote(struct.guid, False, False, False, False)
+            if content is not None or "content" in fields:
+                self.struct.content = content
+                fields.add("content")
+            fields.update(self.struct_fields - set(["content"]))
+
+        else:
+            fields.update(self.struct_fields)
 
+        self._set_fields(fields)
+        return self.struct
+
+    def _get_cache_account(self):
+        """returns the content_cache account the note belongs to, notes that use a
+        store (eg, mirror.Mirror) are cached separately from Evernote's notes"""
+        store = self.__dict__.get("_store")
+        return content_cache.get_account(self.interface if store is None else store)
+
+    def _hydrate_content(self, note_store=None):
+        """Load only the content of the note"""
+        struct = self.struct
+        if not isinstance(struct, EvernoteNote):
+            # query results are NoteMetadata which has nowhere to put the content
+            struct = EvernoteNote()
+            for k, v in vars(self.struct).items():
+                if k in self.struct_fields:
+                    setattr(struct, k, v)
+            self.struct = struct
+
+        fields = set(self._fields or [])
+        if struct.guid:
+            usn = struct.updateSequenceNum
+            account = self._get_cache_account()
+            content = content_cache.get(struct.guid, struct.contentHash, usn, account)
+            if content is None:
+                if note_store is None:
+                    note_store = self.note_store
+                # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNoteContent
+                content = note_store.getNoteContent(struct.guid)
+                content_cache.set(struct.guid, content, usn, account)
+
+            struct.content = content
+            fields.add("content")
+
+        else:
+            fields.update(self.struct_fields)
+
+        self._set_fields(fields)
         return self.struct
 
     def __getattr__(self, k):
@@ -306,8 +428,17 @@ class Note(Enbase):
             ret = getattr(self.struct, k, None)
 
             if ret is None and not self._hydrated:
-                self._hydrate()
-                ret = getattr(self.struct, k)
+                # a fetched field that is None really is None, so it is only
+                # fetched if it wasn't fetched already
+                fields = self._fields
+                if fields is None or k not in fields:
+                    if k == "content":
+                        self._hydrate_content()
+
+                    elif k in self.struct_fields:
+                        self._hydrate_metadata()
+
+                    ret = getattr(self.struct, k)
 
         return ret
 
@@ -371,6 +502,8 @@ class Note(Enbase):
             n = note_store.createNote(self.struct)
 
         self.struct = n
+        content_cache.pop(n.guid, self._get_cache_account())
+        self.query_class.clear_results(self.interface)
 
         for k, v in orig_vals.items():
             setattr(self, k, v)
@@ -408,12 +541,16 @@ class Notebook(Struct):
         # ugh, why would they not return the updated notebook? Sigh
         nb = note_store.getNotebook(self.guid)
         self.struct = nb
+        self.query_class.clear_list(self.interface)
+        self.note_class.query_class.clear_results(self.interface)
 
     def insert(self):
         note_store = self.note_store
         # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_createNotebook
         nb = note_store.createNotebook(self.struct)
         self.struct = nb
+        self.query_class.clear_list(self.interface)
+        self.note_class.query_class.clear_results(self.interface)
 
     def count(self):
         """Return how many notes are in this notebook"""
@@ -436,12 +573,16 @@ class Tag(Struct):
         note_store.updateTag(self.struct)
         tag = note_store.getTag(self.guid)
         self.struct = tag
+        self.query_class.clear_list(self.interface)
+        self.note_class.query_class.clear_results(self.interface)
 
     def insert(self):
         note_store = self.note_store
         # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_createTag
         tag = note_store.createTag(self.struct)
         self.struct = tag
+        self.query_class.clear_list(self.interface)
+        self.note_class.query_class.clear_results(self.interface)
 
 
 Enbase.note_class = Note
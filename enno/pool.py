@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+import sys
+from threading import Thread, Event
+from multiprocessing.pool import ThreadPool
+
+from .compat import *
+
+
+class Prefetch(object):
+    """Iterate the results of callback(arg) for each arg in args, while the caller
+    is working on one result a background thread is already fetching the next
+    size results
+
+    :Example:
+        for page in Prefetch(get_page, [250, 500, 750], size=2):
+            # get_page(500) and get_page(750) are being fetched while we are here
+            pass
+    """
+    timeout = 0.1
+    """how many seconds the background thread waits on a full queue before it
+    checks to see if the caller has stopped iterating"""
+
+    def __init__(self, callback, args, size=1):
+        self.callback = callback
+        self.args = args
+        self.size = max(1, int(size))
+
+    def __iter__(self):
+        q = queue.Queue(maxsize=self.size)
+        stop = Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=self.timeout)
+                    break
+                except queue.Full:
+                    pass
+
+        def target():
+            try:
+                for arg in self.args:
+                    if stop.is_set():
+                        break
+                    put((self.callback(arg), None))
+
+            except Exception:
+                put((None, sys.exc_info()))
+
+            finally:
+                put((done, None))
+
+        th = Thread(target=target)
+        th.daemon = True
+        th.start()
+
+        try:
+            while True:
+                ret, exc_info = q.get()
+                if exc_info:
+                    reraise(*exc_info)
+
+                if ret is done:
+                    break
+
+                yield ret
+
+        finally:
+            # the caller might have stopped iterating early, so let the thread
+            # know it can stop fetching
+            stop.set()
+
+
+def imap(callback, args, workers=1, ordered=True):
+    """Run callback(arg) for each arg in args using a pool of at most workers
+    threads
+
+    :param callback: callable, will be passed each arg
+    :param args: iterable, the args to pass to callback
+    :param workers: int, the size of the thread pool
+    :param ordered: bool, True if the results should be yielded in the same order
+        as args, False if they should be yielded as soon as they are ready
+    :returns: generator, yields each callback(arg) result
+    """
+    pool = ThreadPool(max(1, int(workers)))
+    try:
+        if ordered:
+            rets = pool.imap(callback, args)
+        else:
+            rets = pool.imap_unordered(callback, args)
+
+        for ret in rets:
+            yield ret
+
+    finally:
+        pool.terminate()
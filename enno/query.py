@@ -3,20 +3,96 @@ from __future__ import unicode_literals, division, print_function, absolute_impo
 import re
 import datetime
 import copy
+import bisect
+import time
+import threading
 
 import evernote.edam.notestore.ttypes as NoteStore 
+from evernote.edam.error.ttypes import EDAMNotFoundException
 
 from .compat import *
-from .utils import Plain
+from .utils import Plain, TypeList, convert_many
+from .pool import Prefetch, imap
+from .cache import LRUCache, TTLCache
+from .search import Predicate, parse as parse_words
+from . import environ
+
+
+class ResultCache(LRUCache):
+    """Caches findNotesMetadata() results, every key starts with the account it
+    was fetched from and all the results of an account are thrown away when the
+    account's update count changes, since that means something in the account
+    changed
+
+    http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getSyncState
+    """
+    def __init__(self, size=0, interval=0):
+        """
+        :param size: int, the max results the cache can hold, 0 means nothing is
+            cached
+        :param interval: float, how many seconds can pass between update count
+            checks, results used within interval seconds of the last check are
+            trusted without a request
+        """
+        self.interval = interval
+        self.states = {}
+        super(ResultCache, self).__init__(size)
+
+    def validate(self, account, note_store):
+        """make sure the cached results of account are current
+
+        :param account: string, the account key that starts each key
+        :param note_store: the note store the account's results come from
+        """
+        now = time.time()
+        checked, update_count = self.states.get(account, (0, None))
+        if update_count is None or now - checked >= self.interval:
+            state = note_store.getSyncState()
+            with self.lock:
+                if state.updateCount != update_count:
+                    self.clear_account(account)
+                self.states[account] = (now, state.updateCount)
+
+    def clear_account(self, account):
+        with self.lock:
+            self.states.pop(account, None)
+            for key in list(self.items.keys()):
+                if key[0] == account:
+                    self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.states.clear()
+            super(ResultCache, self).clear()
+
+
+list_cache = TTLCache(environ.LIST_CACHE_TTL)
+"""Process wide cache of the listNotebooks() and listTags() results"""
+
+result_cache = ResultCache(environ.QUERY_CACHE_SIZE, environ.QUERY_CACHE_INTERVAL)
+"""Process wide cache of the findNotesMetadata() results"""
 
 
 class Iterator(list):
+
+    page_cache_size = 10
+    """how many pages an all_items Iterator will hold on to in its page_cache"""
+
     def __init__(self, items, response, model_class, query):
         self.response = response
         self.model_class = model_class
         self.query = query
         self.all_items = False
+        self.prefetch = 0
+        self.workers = 0
+        self.ordered = True
+        self.page_cache = LRUCache(self.page_cache_size)
+        self.resolve_tags = False
+        self.resolve_notebooks = False
+        self.hydration = None
         self.item_count = len(items)
+        # the notes of an in_guid() query are full notes, not metadata
+        self.fields = None if query.guids else query.get_fields()
         super(Iterator, self).__init__(items)
 
     def __len__(self):
@@ -35,35 +111,52 @@ class Iterator(list):
                 model_class=self.model_class,
                 query=self.query
             )
+            instance.fields = self.fields
 
         else:
-            note = super(Iterator, self).__getitem__(index)
-            instance = self.model_class(note)
+            instance = super(Iterator, self).__getitem__(index)
+            if not isinstance(instance, self.model_class):
+                # hold on to the model so anything set on it (eg, resolved tags)
+                # is there the next time it is accessed
+                instance = self.model_class(instance)
+                instance._fields = self.fields
+                if self.query.store is not None:
+                    instance.use(self.query.store)
+                super(Iterator, self).__setitem__(index, instance)
 
         return instance
 
     def _allitem(self, index):
+        limit = self.query.bounds["limit"]
+        offset = self.query.bounds["offset"]
         if isinstance(index, slice):
-            offset = index.start + self.query.bounds["offset"]
-            limit = index.stop - index.start
-            instance = self.query.copy().offset(offset).limit(limit).get()
-            if index.step:
-                instance = instance[0::index.step]
+            items = []
+            for i in range(*index.indices(len(self))):
+                itr = self._get_page(offset + (i // limit) * limit)
+                if i % limit >= itr.item_count:
+                    break
+                items.append(super(Iterator, itr).__getitem__(i % limit))
 
-        else:
-            if index > len(self):
-                raise IndexError("list index out of range")
+            instance = type(self)(
+                items=items,
+                response=self.response,
+                model_class=self.model_class,
+                query=self.query
+            )
+            instance.fields = self.fields
 
+        else:
             if index < 0:
                 index = len(self) + index
 
-            if index < self.item_count:
-                instance = self._getitem(index)
+            if index < 0 or index >= len(self):
+                raise IndexError("list index out of range")
 
-            else:
-                offset = index + self.query.bounds["offset"]
-                note = self.query.copy().offset(offset).get_one()
-                instance = self.model_class(note)
+            itr = self._get_page(offset + (index // limit) * limit)
+            if index % limit >= itr.item_count:
+                raise IndexError("list index out of range")
+
+            instance = itr._getitem(index % limit)
 
         return instance
 
@@ -76,19 +169,217 @@ class Iterator(list):
 
         return instance
 
+    def _get_page(self, offset):
+        """return the page of results starting at offset, pages are cached in
+        page_cache so indexing, slicing and iterating again will not fetch a page
+        that has already been fetched
+
+        :param offset: int, the absolute offset of the page
+        :returns: Iterator
+        """
+        if offset == self.query.bounds["offset"]:
+            return self
+
+        itr = self.page_cache.get(offset)
+        if itr is None:
+            itr = self.query.copy().offset(offset).get()
+            self.page_cache[offset] = itr
+
+        if self.resolve_tags or self.resolve_notebooks:
+            itr.resolve(self.resolve_tags, self.resolve_notebooks)
+
+        if self.hydration:
+            itr.hydrate(**self.hydration)
+        return itr
+
+    def resolve(self, tags=True, notebooks=True):
+        """Fetch the tags and/or notebooks of every note in the page at once, each
+        unique guid is only resolved one time and the same Tag or Notebook
+        instance is set on every note that has it, if all_items is True then
+        every page will be resolved as it is fetched
+
+        :param tags: bool, True to resolve each note's .tags
+        :param notebooks: bool, True to resolve each note's .notebook
+        :returns: self, for chaining
+        """
+        tags = tags and not self.resolve_tags
+        notebooks = notebooks and not self.resolve_notebooks
+        if not tags and not notebooks:
+            # don't build the models when there is nothing to resolve
+            return self
+
+        model_class = self.model_class
+        notes = [self._getitem(index) for index in range(self.item_count)]
+
+        if tags:
+            guids = set()
+            for n in notes:
+                guids.update(n.struct.tagGuids or [])
+
+            if guids:
+                instances = {}
+                query = model_class.tag_class.query.in_guid(*guids)
+                if self.query.store is not None:
+                    query.use(self.query.store)
+                for t in query.get():
+                    instances[t.guid] = t
+
+                for n in notes:
+                    n._tags = TypeList(
+                        model_class.tag_class.assure_instance,
+                        (instances[guid] for guid in n.struct.tagGuids or [] if guid in instances)
+                    )
+
+            self.resolve_tags = True
+
+        if notebooks:
+            guids = set(n.struct.notebookGuid for n in notes if n.struct.notebookGuid)
+            if guids:
+                instances = {}
+                query = model_class.notebook_class.query.in_guid(*guids)
+                if self.query.store is not None:
+                    query.use(self.query.store)
+                for nb in query.get():
+                    instances[nb.guid] = nb
+
+                for n in notes:
+                    nb = instances.get(n.struct.notebookGuid)
+                    if nb is not None:
+                        n._notebook = nb
+
+            self.resolve_notebooks = True
+
+        return self
+
+    def hydrate(self, workers=0, content=True, metadata=False):
+        """Fetch whatever each note in the page is missing at once instead of one
+        note at a time as each note is accessed, if all_items is True then every
+        page will be hydrated as it is fetched
+
+        :param workers: int, if set then the notes will be fetched by this many
+            threads
+        :param content: bool, True to fetch each note's content
+        :param metadata: bool, True to fetch the rest of each note's fields
+        :returns: self, for chaining
+        """
+        if self.all_items:
+            self.hydration = {"workers": workers, "content": content, "metadata": metadata}
+
+        notes = []
+        for index in range(self.item_count):
+            n = self._getitem(index)
+            missing = n._missing_fields()
+            if n.struct.guid and missing:
+                if metadata and (missing - set(["content"])):
+                    notes.append(n)
+
+                elif content and "content" in missing and getattr(n.struct, "content", None) is None:
+                    notes.append(n)
+
+        def hydrate(n, note_store):
+            missing = n._missing_fields()
+            if metadata and (missing - set(["content"])):
+                n._hydrate_metadata(note_store)
+
+            if content and "content" in missing and getattr(n.struct, "content", None) is None:
+                n._hydrate_content(note_store)
+
+        if workers and len(notes) > 1:
+            # each thread needs its own note store
+            local = threading.local()
+            def callback(n):
+                if getattr(local, "note_store", None) is None:
+                    local.note_store = self.query.get_thread_note_store()
+                hydrate(n, local.note_store)
+
+            for _ in imap(callback, notes, min(workers, len(notes))):
+                pass
+
+        else:
+            note_store = self.query.note_store
+            for n in notes:
+                hydrate(n, note_store)
+
+        return self
+
+    def convert(self, to="plain", workers=0, chunksize=0, pool=None):
+        """Convert the content of every note in the page at once, content that
+        hasn't been fetched yet will be fetched one note at a time so call
+        hydrate() first to fetch it all at once
+
+        :param to: string, the format to convert to, one of plain, html, or enml
+        :param workers: int, how many processes to convert with, see convert_many()
+        :param chunksize: int, see convert_many()
+        :param pool: multiprocessing.Pool, a pool the caller owns to convert with,
+            see convert_many()
+        :returns: list, the converted content of each note in the page in order,
+            None if the note doesn't have content
+        """
+        ret = []
+        contents = []
+        for index in range(self.item_count):
+            content = self._getitem(index).content
+            ret.append(None)
+            if content:
+                contents.append((index, content))
+
+        docs = convert_many(
+            (content for _, content in contents),
+            to=to,
+            workers=workers,
+            chunksize=chunksize,
+            pool=pool,
+        )
+        for (index, _), doc in zip(contents, docs):
+            ret[index] = doc
+        return ret
+
+    def pages(self):
+        """yield each page of the results, the first page is always this instance,
+        if all_items is True then the rest of the pages will be fetched from
+        Evernote, if workers is set then all the remaining pages will be fetched
+        concurrently by that many threads (in order unless ordered is False),
+        otherwise if prefetch is set then the next prefetch pages will be fetched
+        in the background while the current page is being consumed
+
+        :returns: generator, yields Iterator instances
+        """
+        yield self
+
+        if self.all_items:
+            limit = self.query.bounds["limit"]
+            offset = self.query.bounds["offset"]
+            offsets = range(offset + limit, self.response.totalNotes, limit)
+            if self.workers:
+                itrs = imap(self._get_page, offsets, self.workers, self.ordered)
+
+            elif self.prefetch:
+                itrs = Prefetch(self._get_page, offsets, self.prefetch)
+
+            else:
+                itrs = (self._get_page(offset) for offset in offsets)
+
+            for itr in itrs:
+                yield itr
+
     def __iter__(self):
-        limit = self.query.bounds["limit"]
-        offset = self.query.bounds["offset"]
-        total = len(self) + offset
-        itr = self
-        while offset < total:
-            item_count = itr.item_count
-            for index in range(item_count):
+        for itr in self.pages():
+            for index in range(itr.item_count):
                 yield itr[index]
 
-            offset += limit
-            if self.all_items and offset < total:
-                itr = self.query.copy().offset(offset).get()
+
+class NoteSpec(object):
+    """What getNote should return for each note, this has the same attributes as
+    NoteStore.NoteResultSpec, which the python sdk doesn't have yet
+
+    http://dev.evernote.com/doc/reference/NoteStore.html#Struct_NoteResultSpec
+    """
+    def __init__(self, includeContent=False, includeResourcesData=False,
+                 includeResourcesRecognition=False, includeResourcesAlternateData=False):
+        self.includeContent = includeContent
+        self.includeResourcesData = includeResourcesData
+        self.includeResourcesRecognition = includeResourcesRecognition
+        self.includeResourcesAlternateData = includeResourcesAlternateData
 
 
 class NoteQuery(object):
@@ -101,12 +392,20 @@ class NoteQuery(object):
     all Thrift functions:
         http://dev.evernote.com/doc/reference/
     """
+    @property
+    def note_store(self):
+        if self._note_store is None:
+            self._note_store = self.interface.get_note_store()
+        return self._note_store
+
     def __init__(self, note_class):
         self.model_class = note_class
         self.interface = note_class.interface
-        self.note_store = self.interface.get_note_store()
+        self._note_store = None
+        self.store = None
         self.note_filter = NoteStore.NoteFilter()
-        self.guids = set()
+        self.guids = []
+        self.note_spec = NoteSpec()
 
         self.spec = NoteStore.NotesMetadataResultSpec()
         # These are the spec instance properties you can set:
@@ -126,12 +425,61 @@ class NoteQuery(object):
         self.spec.includeUpdated = True
         self.spec.includeNotebookGuid = True
         self.spec.includeTagGuids = True
+        # lets cached content be checked against the note without fetching it
+        self.spec.includeUpdateSequenceNum = True
 
         self.bounds = {
             "limit": 50,
             "offset": 0
         }
 
+    def select(self, *fields):
+        """Only fetch fields for each matching note, the guid is always fetched,
+        accessing a field that wasn't selected will load the full note
+
+        :Example:
+            Note.query.select("title", "content_length").get()
+
+        :param *fields: the note fields (eg, title, updated, content_length), these
+            can be camelcase (eg, contentLength) or underscored
+        :returns: self, for chaining
+        """
+        spec = NoteStore.NotesMetadataResultSpec()
+        for field in fields:
+            k = self.model_class.convert_key(field)
+            if k != "guid":
+                include = "include{}{}".format(k[0].upper(), k[1:])
+                if not hasattr(spec, include):
+                    raise ValueError("Cannot select note field {}".format(field))
+                setattr(spec, include, True)
+
+        self.spec = spec
+        return self
+
+    def get_fields(self):
+        """returns the set of note fields findNotesMetadata() will return with .spec"""
+        ret = set(["guid"])
+        for k, v in vars(self.spec).items():
+            if v and k.startswith("include"):
+                ret.add("{}{}".format(k[7].lower(), k[8:]))
+        return ret
+
+    def use(self, note_store):
+        """Run the query against note_store instead of Evernote
+
+        :param note_store: anything with the NoteStore methods the query uses (eg,
+            mirror.Mirror)
+        :returns: self, for chaining
+        """
+        self.store = note_store
+        self._note_store = note_store
+        return self
+
+    def get_thread_note_store(self):
+        """returns a note store that can be used in another thread, the thrift
+        client of the Evernote note store can't be shared between threads"""
+        return self.interface.get_note_store() if self.store is None else self.store
+
     def desc(self):
         self.note_filter.ascending = False
         return self
@@ -149,12 +497,13 @@ class NoteQuery(object):
         return self
 
     def is_guid(self, guid):
-        self.guids.clear()
-        self.guids.add(guid)
+        self.guids = [guid]
         return self
 
     def in_guid(self, *guids):
-        self.guids.update(guids)
+        for guid in guids:
+            if guid not in self.guids:
+                self.guids.append(guid)
         return self
 
     def is_notebook(self, nb):
@@ -166,7 +515,10 @@ class NoteQuery(object):
 
         else:
             name = nb
-            nb = self.model_class.notebook_class.query.is_name(name).one()
+            query = self.model_class.notebook_class.query
+            if self.store is not None:
+                query.use(self.store)
+            nb = query.is_name(name).one()
 
             if nb is None:
                 raise ValueError("Notebook {} was not found".format(Plain(name)))
@@ -229,23 +581,106 @@ class NoteQuery(object):
     def years(self, count=0):
         return self._format_relative("year", count)
 
-    def get(self, limit=0, offset=0):
+    def _find(self, offset, limit, note_store=None):
+        if note_store is None:
+            note_store = self.note_store
+
+        # a local store (eg, mirror.Mirror) is already fast so it isn't cached
+        cache = result_cache.size and self.store is None
+        if cache:
+            key = self._get_result_key(offset, limit)
+            result_cache.validate(key[0], note_store)
+            response = result_cache.get(key)
+            if response is not None:
+                # models change their structs so everyone gets their own copy
+                return copy.deepcopy(response)
+
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_findNotesMetadata
+        response = note_store.findNotesMetadata(
+            self.note_filter,
+            offset,
+            limit,
+            self.spec
+        )
+
+        if cache:
+            result_cache.set(key, copy.deepcopy(response))
+        return response
+
+    def _get_result_key(self, offset, limit):
+        """returns a key that is the same for every query that would get the same
+        findNotesMetadata() results"""
+        def canonical(struct):
+            ret = []
+            for k, v in sorted(vars(struct).items()):
+                if v is not None:
+                    ret.append((k, tuple(sorted(v)) if isinstance(v, list) else v))
+            return tuple(ret)
+
+        return (
+            self._get_account_key(self.interface),
+            canonical(self.note_filter),
+            canonical(self.spec),
+            offset,
+            limit,
+        )
+
+    @classmethod
+    def _get_account_key(cls, interface):
+        return getattr(interface, "token", id(interface))
+
+    @classmethod
+    def clear_results(cls, interface):
+        """Remove all the cached results of the account, this is called when a
+        model is saved
+
+        :param interface: EvernoteClient
+        """
+        result_cache.clear_account(cls._get_account_key(interface))
+
+    def _get_note(self, note_store, guid, note_spec):
+        # python evernote doesn't seem to have this method:
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNoteWithResultSpec
+        # so we will use the deprecated method:
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNote
+        return note_store.getNote(
+            guid,
+            note_spec.includeContent,
+            note_spec.includeResourcesData,
+            note_spec.includeResourcesRecognition,
+            note_spec.includeResourcesAlternateData,
+        )
+
+    def _get_notes(self, guids, note_spec):
+        # each batch of guids gets its own note store
+        note_store = self.get_thread_note_store()
+        return [self._get_note(note_store, guid, note_spec) for guid in guids]
+
+    def get(self, limit=0, offset=0, workers=0, note_spec=None):
+        """Run the query
+
+        :param limit: int, how many notes to return
+        :param offset: int, where to start in the matching notes
+        :param workers: int, only used with in_guid(), if set then the notes will
+            be fetched in batches by this many threads
+        :param note_spec: NoteSpec, only used with in_guid(), what should be
+            returned for each note, defaults to .note_spec
+        :returns: Iterator
+        """
         if self.guids:
-            items = []
-            #pout.i(self.note_store._client)
-            for guid in self.guids:
-                # python evernote doesn't seem to have this method:
-                # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNoteWithResultSpec
-                #items.append(self.note_store.getNoteWithResultSpec(guid, self.spec))
-                # so we will use the deprecated method:
-                # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNote
-                items.append(self.note_store.getNote(
-                    guid,
-                    False,
-                    False,
-                    False,
-                    False,
-                ))
+            if note_spec is None:
+                note_spec = self.note_spec
+
+            if workers and len(self.guids) > 1:
+                workers = min(workers, len(self.guids))
+                size = -(-len(self.guids) // workers)
+                batches = [self.guids[i:i + size] for i in range(0, len(self.guids), size)]
+                items = []
+                for notes in imap(lambda guids: self._get_notes(guids, note_spec), batches, workers):
+                    items.extend(notes)
+
+            else:
+                items = [self._get_note(self.note_store, guid, note_spec) for guid in self.guids]
 
             # TODO -- should this take into account asc and desc?
 
@@ -258,27 +693,89 @@ class NoteQuery(object):
             if limit: self.limit(limit)
             if offset: self.offset(offset)
 
-            # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_findNotesMetadata
-            response = self.note_store.findNotesMetadata(
-                self.note_filter,
-                self.bounds["offset"],
-                self.bounds["limit"],
-                self.spec
-            )
+            response = self._find(self.bounds["offset"], self.bounds["limit"])
             items = response.notes
 
-        return Iterator(
+        ret = Iterator(
             items=items,
             response=response,
             model_class=self.model_class,
             query=self
         )
 
-    def all(self):
+        if self.guids:
+            ret.fields = set(self.model_class.struct_fields)
+            if not note_spec.includeContent:
+                ret.fields.discard("content")
+
+        return ret
+
+    def all(self, prefetch=0, workers=0, ordered=True, page_cache=Iterator.page_cache_size):
+        """Returns an Iterator that will go through every note matching the query
+
+        :param prefetch: int, how many pages should be fetched in the background
+            while the current page is being iterated
+        :param workers: int, if set then once the first page is fetched all the
+            remaining pages will be fetched concurrently by this many threads
+        :param ordered: bool, only used with workers, pass in False if you don't
+            care about the order and want each page as soon as it is fetched
+        :param page_cache: int, how many fetched pages will be kept around so
+            indexing, slicing and iterating again can reuse them
+        :returns: Iterator
+        """
         itr = self.get(limit=250)
         itr.all_items = True
+        itr.prefetch = prefetch
+        itr.workers = workers
+        itr.ordered = ordered
+        itr.page_cache.size = page_cache
         return itr
 
+    def stream(self, prefetch=0):
+        """Yield every note matching the query, unlike all() nothing holds on to
+        the pages, each page is dropped once its notes have been yielded, so
+        memory stays flat no matter how many notes match the query
+
+        :param prefetch: int, how many pages should be fetched in the background
+            while the current page is being iterated
+        :returns: generator, yields model_class instances
+        """
+        if self.guids:
+            for n in self.get():
+                yield n
+            return
+
+        limit = 250
+        offset = self.bounds["offset"]
+
+        response = self._find(offset, limit)
+        offsets = range(offset + limit, response.totalNotes, limit)
+        notes = response.notes
+        response = None
+
+        if prefetch:
+            # the background thread needs its own note store
+            pages = Prefetch(
+                lambda offset: self._find(offset, limit, self.get_thread_note_store()).notes,
+                offsets,
+                prefetch
+            )
+
+        else:
+            pages = (self._find(offset, limit).notes for offset in offsets)
+
+        fields = self.get_fields()
+        pages = iter(pages)
+        while notes is not None:
+            for note in notes:
+                instance = self.model_class(note)
+                instance._fields = fields
+                yield instance
+
+            # drop this page before fetching the next one
+            notes = None
+            notes = next(pages, None)
+
     def get_one(self): return self.one()
     def one(self):
         for n in self.get(limit=1):
@@ -297,16 +794,87 @@ class NoteQuery(object):
             ret += count
         return ret
 
+    def compile(self, now=None):
+        """Compile the query into a callback that takes a note and returns True if
+        the note matches the query, this lets the query filter notes that are already
+        in memory (eg, cached or mirrored notes) without asking Evernote
+
+        :param now: datetime, what relative dates (eg, updated:day-1) are relative to
+        :returns: callable
+        """
+        note_filter = self.note_filter
+        fields = set(t.field for t in parse_words(note_filter.words))
+        names = {}
+        for field, model_class in [
+            ("notebook", self.model_class.notebook_class),
+            ("tag", self.model_class.tag_class),
+        ]:
+            if field in fields:
+                query = model_class.query
+                if self.store is not None:
+                    query.use(self.store)
+                names[field] = dict((m.guid, m.name) for m in query.get())
+
+        predicate = Predicate(
+            note_filter.words,
+            notebooks=names.get("notebook"),
+            tags=names.get("tag"),
+            now=now,
+        )
+        guids = set(self.guids)
+        notebook_guid = note_filter.notebookGuid
+        tag_guids = set(note_filter.tagGuids or [])
+        inactive = bool(note_filter.inactive)
+
+        def matches(note):
+            struct = getattr(note, "struct", note)
+            if guids and struct.guid not in guids:
+                return False
+
+            if notebook_guid and struct.notebookGuid != notebook_guid:
+                return False
+
+            if tag_guids and not tag_guids.issubset(struct.tagGuids or []):
+                return False
+
+            # note metadata doesn't have active so those notes are assumed active
+            active = getattr(struct, "active", None)
+            if (active is None or active) == inactive:
+                return False
+
+            return predicate(note)
+
+        return matches
+
+    def matches(self, note):
+        """returns True if note matches the query, use compile() or matching() when
+        checking more than a few notes"""
+        return self.compile()(note)
+
+    def matching(self, notes, now=None):
+        """Yield the notes that match the query
+
+        :param notes: iterable, model_class instances or evernote Note structs
+        :returns: generator, the notes that match
+        """
+        matches = self.compile(now=now)
+        for note in notes:
+            if matches(note):
+                yield note
+
     def copy(self):
         """nice handy wrapper around the deepcopy"""
         return copy.deepcopy(self)
 
     def __deepcopy__(self, memodict={}):
         instance = type(self)(self.model_class)
-        ignore_keys = set(["interface", "note_store"])
+        ignore_keys = set(["interface", "_note_store", "store"])
         for key, val in self.__dict__.items():
             if key not in ignore_keys:
                 setattr(instance, key, copy.deepcopy(val, memodict))
+
+        if self.store is not None:
+            instance.use(self.store)
         return instance
 
     def _format_relative(self, relative, count):
@@ -318,11 +886,11 @@ class NoteQuery(object):
         if isinstance(dt, basestring):
             ws = self._format_words([dt], prefix=prefix)
 
-        elif isinstance(dt, datetime.date):
-            ws = self._format_words([datetime.strftime("%Y%m%d")], prefix=prefix)
-
         elif isinstance(dt, datetime.datetime):
-            ws = self._format_words([datetime.strftime("%Y%m%dT%H%M%S")], prefix=prefix)
+            ws = self._format_words([dt.strftime("%Y%m%dT%H%M%S")], prefix=prefix)
+
+        elif isinstance(dt, datetime.date):
+            ws = self._format_words([dt.strftime("%Y%m%d")], prefix=prefix)
 
         else:
             raise ValueError("Not sure how to handle date value")
@@ -353,12 +921,104 @@ class NoteQuery(object):
         return self
 
 
+class ListIndex(object):
+    """Indexes a listNotebooks() or listTags() result by guid and lowercase name,
+    the lowercase names are also kept sorted so prefix lookups can use a binary
+    search
+
+    Guids that were looked up after the list was fetched are added to the index,
+    and the ones that didn't exist are kept in missing, so each guid is only
+    looked up once for as long as the index is cached
+
+    https://docs.python.org/3/library/bisect.html
+    """
+    def __init__(self, structs):
+        self.structs = structs
+        self.positions = {}
+        self.guids = {}
+        self.names = {}
+        self.lower_names = {}
+        self.missing = set()
+        self.lock = threading.RLock()
+
+        sorted_names = []
+        for position, struct in enumerate(structs):
+            name = self._index(struct, position)
+            sorted_names.append((name, position))
+
+        sorted_names.sort()
+        self.sorted_names = [name for name, position in sorted_names]
+        self.sorted_positions = [position for name, position in sorted_names]
+
+    def _index(self, struct, position):
+        name = Plain(struct.name).lower() if struct.name else ""
+        self.positions[struct.guid] = position
+        self.guids[struct.guid] = struct
+        self.names.setdefault(name, struct)
+        self.lower_names[struct.guid] = name
+        return name
+
+    def add(self, struct):
+        """add a struct that wasn't in the fetched list (eg, it was created after
+        the list was cached)"""
+        with self.lock:
+            if struct.guid in self.positions:
+                return
+
+            # the list is shared so it is replaced instead of appended to, that
+            # way a query already iterating the old list isn't affected
+            position = len(self.structs)
+            self.structs = self.structs + [struct]
+            name = self._index(struct, position)
+            i = bisect.bisect_right(self.sorted_names, name)
+            self.sorted_names.insert(i, name)
+            self.sorted_positions.insert(i, position)
+            self.missing.discard(struct.guid)
+
+    def is_name(self, name):
+        struct = self.names.get(name)
+        return [] if struct is None else [struct]
+
+    def startswith_name(self, name):
+        positions = []
+        with self.lock:
+            i = bisect.bisect_left(self.sorted_names, name)
+            while i < len(self.sorted_names) and self.sorted_names[i].startswith(name):
+                positions.append(self.sorted_positions[i])
+                i += 1
+            return [self.structs[position] for position in sorted(positions)]
+
+    def in_guid(self, guids):
+        positions = (self.positions[guid] for guid in guids if guid in self.positions)
+        return [self.structs[position] for position in sorted(positions)]
+
+
 class NotebookQuery(object):
+
+    name_ops = {
+        "is": lambda v, name: v == name,
+        "startswith": lambda v, name: v.startswith(name),
+        "endswith": lambda v, name: v.endswith(name),
+        "contains": lambda v, name: name in v,
+    }
+    """the comparisons the *_name() methods can do, these are checked against
+    the lowercase names in the ListIndex"""
+
+    @property
+    def note_store(self):
+        # only get the note store when a request actually needs to be made since
+        # most queries will be answered by the cached list
+        if self._note_store is None:
+            self._note_store = self.interface.get_note_store()
+        return self._note_store
+
     def __init__(self, model_class):
         self.model_class = model_class
         self.interface = model_class.interface
-        self.note_store = self.interface.get_note_store()
+        self._note_store = None
+        self.store = None
         self.filter_cbs = []
+        self.name_filters = []
         self.sort_kwargs = {}
         self.guids = set()
         self.bounds = {"limit": 0}
@@ -371,6 +1031,18 @@ class NotebookQuery(object):
                 break
         return ret
 
+    def _filter_name(self, index, struct):
+        name = index.lower_names.get(struct.guid)
+        if name is None:
+            name = Plain(struct.name).lower() if struct.name else ""
+
+        ret = True
+        for op, v in self.name_filters:
+            if not self.name_ops[op](name, v):
+                ret = False
+                break
+        return ret
+
     def asc(self):
         # https://docs.python.org/3/howto/sorting.html#sortinghowto
         self.sort_kwargs = {"key": lambda x: x.updated, "reverse": False}
@@ -382,23 +1054,30 @@ class NotebookQuery(object):
         return self
 
     def startswith_name(self, name):
-        name = Plain(name).lower()
-        self.filter_cbs.append(lambda x: Plain(x.name).lower().startswith(name))
+        self.name_filters.append(("startswith", Plain(name).lower()))
         return self
 
     def endswith_name(self, name):
-        name = Plain(name).lower()
-        self.filter_cbs.append(lambda x: Plain(x.name).lower().endswith(name))
+        self.name_filters.append(("endswith", Plain(name).lower()))
         return self
 
     def contains_name(self, name):
-        name = Plain(name).lower()
-        self.filter_cbs.append(lambda x: name in Plain(x.name).lower())
+        self.name_filters.append(("contains", Plain(name).lower()))
         return self
 
     def is_name(self, name):
-        name = Plain(name).lower()
-        self.filter_cbs.append(lambda x: name == Plain(x.name).lower())
+        self.name_filters.append(("is", Plain(name).lower()))
+        return self
+
+    def use(self, note_store):
+        """Run the query against note_store instead of Evernote
+
+        :param note_store: anything with the NoteStore methods the query uses (eg,
+            mirror.Mirror)
+        :returns: self, for chaining
+        """
+        self.store = note_store
+        self._note_store = note_store
         return self
 
     def is_guid(self, guid):
@@ -420,52 +1099,112 @@ class NotebookQuery(object):
         return self
 
     def get_guid(self, guid):
-        model = self.note_store.getNotebook(guid)
+        model = self._fetch_guid(guid)
         return self._create_model(model) if model else None
 
+    @classmethod
+    def _get_list_key(cls, interface):
+        # anything that isn't an EvernoteClient (eg, a mirror.Mirror) is cached
+        # by its identity
+        return (getattr(interface, "token", id(interface)), cls.__name__)
+
+    @classmethod
+    def clear_list(cls, interface):
+        """Remove the cached list so the next query will fetch it again, this is
+        called when a model is inserted or updated
+
+        :param interface: EvernoteClient|note store, whatever the list was fetched
+            with
+        """
+        list_cache.pop(cls._get_list_key(interface), None)
+
+    def _get_index(self):
+        key = self._get_list_key(self.interface if self.store is None else self.store)
+        ret = list_cache.get(key)
+        if ret is None:
+            ret = ListIndex(self._fetch_list())
+            list_cache.set(key, ret)
+        return ret
+
     def _get_list(self):
+        return self._get_index().structs
+
+    def _fetch_list(self):
         return self.note_store.listNotebooks()
 
+    def _fetch_guid(self, guid):
+        return self.note_store.getNotebook(guid)
+
     def _create_model(self, model):
-        return self.model_class(model)
+        # the cached list is shared, so don't let the model change it
+        instance = self.model_class(copy.copy(model))
+        if self.store is not None:
+            instance.use(self.store)
+        return instance
 
-    def get(self):
-        limit = self.bounds["limit"]
-        count = 0
+    def _get_structs(self, index):
+        """use the index to narrow down the structs that need to be checked"""
+        if self.guids:
+            for guid in self.guids:
+                if guid in index.positions or guid in index.missing:
+                    continue
+
+                # it might have been created after the list was cached, it's
+                # fetched on its own so a guid that doesn't exist costs one
+                # request per list_cache ttl instead of a whole list every query
+                try:
+                    struct = self._fetch_guid(guid)
+
+                except EDAMNotFoundException:
+                    struct = None
 
-        if len(self.guids) == 1:
-            model = self.get_guid(list(self.guids)[0])
-            if model is not None:
-                yield model
+                if struct is None:
+                    index.missing.add(guid)
+
+                else:
+                    index.add(struct)
+
+            structs = index.in_guid(self.guids)
 
         else:
-            ret = []
-            for enb in self._get_list():
-                nb = self._create_model(enb)
+            structs = index.structs
+            for op, name in self.name_filters:
+                if op == "is":
+                    structs = index.is_name(name)
+                    break
+
+                elif op == "startswith":
+                    structs = index.startswith_name(name)
+                    break
+
+        return structs
+
+    def get(self):
+        limit = self.bounds["limit"]
+        count = 0
 
-                if self.guids:
-                    if nb.guid in self.guids and self._filter(nb):
-                        if self.sort_kwargs:
-                            ret.append(nb)
-                        else:
-                            yield nb
+        index = self._get_index()
+        ret = []
+        for enb in self._get_structs(index):
+            if not self._filter_name(index, enb):
+                continue
 
+            nb = self._create_model(enb)
+            if self._filter(nb):
+                if self.sort_kwargs:
+                    ret.append(nb)
                 else:
-                    if self._filter(nb):
-                        if self.sort_kwargs:
-                            ret.append(nb)
-                        else:
-                            yield nb
+                    yield nb
 
                 count += 1
                 if limit and count == limit:
                     break
 
-            if ret:
-                if self.sort_kwargs:
-                    ret.sort(**self.sort_kwargs)
-                    for nb in ret:
-                        yield nb
+        if ret:
+            if self.sort_kwargs:
+                ret.sort(**self.sort_kwargs)
+                for nb in ret:
+                    yield nb
 
     def get_one(self): return self.one()
     def one(self):
@@ -483,13 +1222,12 @@ class NotebookQuery(object):
 
 
 class TagQuery(NotebookQuery):
-    def get_guid(self, guid):
-        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getTag
-        model = self.note_store.getTag(guid)
-        return self._create_model(model) if model else None
-
-    def _get_list(self):
+    def _fetch_list(self):
         # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_listTags
         return self.note_store.listTags()
 
+    def _fetch_guid(self, guid):
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getTag
+        return self.note_store.getTag(guid)
+
 
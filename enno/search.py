@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+import re
+import datetime
+import calendar
+
+from .compat import *
+from .utils import Plain, ENML
+
+
+class Term(object):
+    """One term of an Evernote search, eg, -intitle:"foo bar" would be a Term with
+    field "intitle", value "foo bar" and negated True
+
+    https://dev.evernote.com/doc/articles/search_grammar.php
+    """
+    fields = set([
+        "any",
+        "intitle",
+        "notebook",
+        "tag",
+        "created",
+        "updated",
+    ])
+    """the fields NoteQuery knows how to create"""
+
+    def __init__(self, value, field="", negated=False):
+        self.value = value
+        self.field = field
+        self.negated = negated
+
+    def __repr__(self):
+        return "{}{}{}".format(
+            "-" if self.negated else "",
+            "{}:".format(self.field) if self.field else "",
+            '"{}"'.format(self.value) if " " in self.value else self.value,
+        )
+
+
+class Tokenizer(object):
+    """Splits text into lowercase word tokens"""
+    regex = re.compile(r"\w+", re.U)
+
+    def tokens(self, text):
+        """
+        :param text: string
+        :returns: list, the lowercase words of text in order
+        """
+        return [m.group(0).lower() for m in self.regex.finditer(Plain(text))] if text else []
+
+
+def parse(words):
+    """Split an Evernote search string (eg, NoteFilter.words) into its terms
+
+    :param words: string, the search grammar string
+    :returns: list, Term instances
+    """
+    ret = []
+    if words:
+        regex = re.compile(r'(-?)(?:([a-zA-Z]+):)?(?:"([^"]*)"?|(\S*))', re.U)
+        for m in regex.finditer(words):
+            negated, field, quoted, value = m.groups()
+            if quoted is None:
+                value = value or ""
+
+            else:
+                value = quoted
+
+            if not field and not value:
+                continue
+
+            field = field.lower() if field else ""
+            if field and field not in Term.fields:
+                # the colon was part of a word (eg, a url)
+                value = "{}:{}".format(field, value)
+                field = ""
+
+            ret.append(Term(value, field, bool(negated)))
+
+    return ret
+
+
+def parse_date(value, now=None):
+    """Convert an Evernote search date value into a datetime
+
+    https://dev.evernote.com/doc/articles/search_grammar.php#Date_Time_Format
+
+    :param value: string, either an absolute date like 20170101 or 20170101T120000Z
+        or a relative date like day, day-1, week-2, month or year-3
+    :param now: datetime, what relative dates are relative to, defaults to utcnow
+    :returns: datetime
+    """
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    m = re.match(r"^(day|week|month|year)(?:-(\d+))?$", value, re.I)
+    if m:
+        relative = m.group(1).lower()
+        count = int(m.group(2) or 0)
+        today = datetime.datetime(now.year, now.month, now.day)
+        if relative == "day":
+            ret = today - datetime.timedelta(days=count)
+
+        elif relative == "week":
+            # Evernote weeks start on sunday
+            sunday = today - datetime.timedelta(days=(today.weekday() + 1) % 7)
+            ret = sunday - datetime.timedelta(weeks=count)
+
+        elif relative == "month":
+            months = (now.year * 12 + now.month - 1) - count
+            ret = datetime.datetime(months // 12, months % 12 + 1, 1)
+
+        else:
+            ret = datetime.datetime(now.year - count, 1, 1)
+
+    else:
+        m = re.match(r"^(\d{8})(?:T(\d{6}))?Z?$", value, re.I)
+        if not m:
+            raise ValueError("Not sure how to handle date value {}".format(value))
+
+        if m.group(2):
+            ret = datetime.datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S")
+
+        else:
+            ret = datetime.datetime.strptime(m.group(1), "%Y%m%d")
+
+    return ret
+
+
+def parse_timestamp(value, now=None):
+    """Same as parse_date() but returns the date as milliseconds since the epoch,
+    which is how Evernote stores created and updated"""
+    dt = parse_date(value, now=now)
+    return calendar.timegm(dt.utctimetuple()) * 1000
+
+
+class Document(object):
+    """Wraps a note so the words of its title and content are only found once no
+    matter how many terms look at them"""
+    def __init__(self, note, tokenizer):
+        """
+        :param note: model.Note|evernote Note
+        :param tokenizer: Tokenizer
+        """
+        self.note = note
+        self.struct = getattr(note, "struct", note)
+        self.tokenizer = tokenizer
+        self.tokens = {}
+        self.token_sets = {}
+
+    def get_text(self, field):
+        if field == "title":
+            return self.struct.title
+
+        if self.note is self.struct:
+            content = self.struct.content
+            if content is None:
+                raise ValueError("Note {} has no content to search".format(self.struct.guid))
+            return ENML(content).plain()
+
+        # the model will load its content if it needs to
+        return self.note.plain
+
+    def get_tokens(self, field):
+        if field not in self.tokens:
+            self.tokens[field] = self.tokenizer.tokens(self.get_text(field))
+        return self.tokens[field]
+
+    def get_token_set(self, field):
+        if field not in self.token_sets:
+            self.token_sets[field] = set(self.get_tokens(field))
+        return self.token_sets[field]
+
+
+class Predicate(object):
+    """A compiled Evernote search, calling it with a note returns True if the note
+    would be in the server's results for the search
+
+    :Example:
+        p = Predicate('intitle:foo -bar created:day-7')
+        notes = [n for n in notes if p(n)]
+    """
+    tokenizer_class = Tokenizer
+
+    def __init__(self, words, notebooks=None, tags=None, now=None):
+        """
+        :param words: string, the search grammar string (eg, NoteFilter.words)
+        :param notebooks: dict, notebook guid -> name, only needed if the search
+            has notebook: terms
+        :param tags: dict, tag guid -> name, only needed if the search has tag: terms
+        :param now: datetime, what relative dates (eg, day-1) are relative to
+        """
+        self.tokenizer = self.tokenizer_class()
+        self.notebooks = notebooks
+        self.tags = tags
+        self.all_tests = []
+        self.any_tests = []
+
+        terms = parse(words)
+        match_any = any(t.field == "any" and not t.value for t in terms)
+        for term in terms:
+            if term.field == "any" and not term.value:
+                continue
+
+            test = self.compile_term(term, now)
+            if test is None:
+                continue
+
+            if match_any or (term.field == "any" and not term.negated):
+                self.any_tests.append(test)
+
+            else:
+                self.all_tests.append(test)
+
+    def compile_term(self, term, now=None):
+        """returns a callback that takes a Document and returns True if the term
+        matches, or None if the term can't match anything (eg, punctuation)"""
+        field = term.field
+        value = term.value
+
+        if field in set(["created", "updated"]):
+            # created:X means on or after X and -created:X means before X, so the
+            # negation is already handled
+            timestamp = parse_timestamp(value, now=now)
+            if term.negated:
+                return lambda doc: (getattr(doc.struct, field) or 0) < timestamp
+            return lambda doc: (getattr(doc.struct, field) or 0) >= timestamp
+
+        prefix = value.endswith("*")
+        if field in set(["", "any", "intitle"]):
+            tokens = self.tokenizer.tokens(value)
+            if not tokens:
+                return None
+
+            fields = ["title"] if field == "intitle" else ["title", "content"]
+            test = lambda doc: any(self.match_tokens(doc, f, tokens, prefix) for f in fields)
+
+        elif field == "notebook":
+            names = self.get_names(self.notebooks, field)
+            name = self.normalize_name(value)
+            test = lambda doc: self.match_name(names.get(doc.struct.notebookGuid), name, prefix)
+
+        elif field == "tag":
+            names = self.get_names(self.tags, field)
+            name = self.normalize_name(value)
+            test = lambda doc: any(
+                self.match_name(names.get(guid), name, prefix) for guid in doc.struct.tagGuids or []
+            )
+
+        else:
+            raise ValueError("Search term {} is not supported".format(term))
+
+        if term.negated:
+            return lambda doc: not test(doc)
+        return test
+
+    def get_names(self, names, field):
+        if names is None:
+            raise ValueError("{} names are needed to search {}: terms".format(field, field))
+        return dict((guid, Plain(name).lower()) for guid, name in names.items())
+
+    def normalize_name(self, value):
+        value = Plain(value).lower()
+        return value[:-1] if value.endswith("*") else value
+
+    def match_name(self, v, name, prefix):
+        if v is None:
+            return False
+        return v.startswith(name) if prefix else v == name
+
+    def match_tokens(self, doc, field, tokens, prefix):
+        """returns True if tokens appear next to each other in the field of doc"""
+        if len(tokens) == 1 and not prefix:
+            return tokens[0] in doc.get_token_set(field)
+
+        haystack = doc.get_tokens(field)
+        head = tokens[:-1]
+        last = tokens[-1]
+        n = len(head)
+        for i in range(len(haystack) - n):
+            if haystack[i:i + n] == head:
+                v = haystack[i + n]
+                if v.startswith(last) if prefix else v == last:
+                    return True
+        return False
+
+    def __call__(self, note):
+        doc = Document(note, self.tokenizer)
+        for test in self.all_tests:
+            if not test(doc):
+                return False
+
+        if self.any_tests:
+            return any(test(doc) for test in self.any_tests)
+
+        return True
+
+
+def compile(words, notebooks=None, tags=None, now=None):
+    """compile an Evernote search string into a callback that takes a note and
+    returns True if the note matches the search
+
+    :param words: string, the search grammar string
+    :returns: Predicate
+    """
+    return Predicate(words, notebooks=notebooks, tags=tags, now=now)
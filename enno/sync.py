@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+import os
+import pickle
+import threading
+
+import evernote.edam.notestore.ttypes as NoteStore
+
+from .compat import *
+from .interface import get_interface
+from .pool import imap
+
+
+class Replica(object):
+    """Holds a local copy of the account's notes, notebooks and tags along with the
+    update sequence number (usn) the copy is current to
+
+    This keeps everything in memory and, if path is given, pickles it to path
+    each time it is committed. Subclasses (eg, mirror.Mirror) can store things
+    differently by overriding the save_*, expunge_*, clear and commit methods
+    """
+    def __init__(self, path=""):
+        self.path = path
+        self.usn = 0
+        self.last_sync = 0
+        self.notes = {}
+        self.notebooks = {}
+        self.tags = {}
+
+        if path and os.path.isfile(path):
+            with open(path, "rb") as fp:
+                self.__dict__.update(pickle.load(fp))
+
+    def get_content_hash(self, guid):
+        """returns the contentHash of the note's content that is stored locally,
+        or None if the replica doesn't have the content"""
+        note = self.notes.get(guid)
+        return note.contentHash if note is not None and note.content is not None else None
+
+    def save_notes(self, notes):
+        for note in notes:
+            if note.content is None:
+                # keep the content we already have if it hasn't changed
+                if self.get_content_hash(note.guid) == note.contentHash:
+                    note.content = self.notes[note.guid].content
+            self.notes[note.guid] = note
+
+    def expunge_notes(self, guids):
+        for guid in guids:
+            self.notes.pop(guid, None)
+
+    def save_notebooks(self, notebooks):
+        for notebook in notebooks:
+            self.notebooks[notebook.guid] = notebook
+
+    def expunge_notebooks(self, guids):
+        for guid in guids:
+            self.notebooks.pop(guid, None)
+
+    def save_tags(self, tags):
+        for tag in tags:
+            self.tags[tag.guid] = tag
+
+    def expunge_tags(self, guids):
+        for guid in guids:
+            self.tags.pop(guid, None)
+
+    def clear(self):
+        """throw everything away, this is called before a full sync"""
+        self.usn = 0
+        self.last_sync = 0
+        self.notes = {}
+        self.notebooks = {}
+        self.tags = {}
+
+    def commit(self):
+        """called after each sync chunk is applied so a sync can pick up where it
+        left off if it fails"""
+        if self.path:
+            state = dict((k, v) for k, v in self.__dict__.items() if k != "path")
+            tmp_path = "{}.tmp".format(self.path)
+            with open(tmp_path, "wb") as fp:
+                pickle.dump(state, fp, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.path)
+
+
+class Sync(object):
+    """Keeps a Replica current with the account using update sequence numbers, the
+    first run pulls everything and each run after that only pulls what changed
+
+    https://dev.evernote.com/doc/articles/synchronization.php
+    http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getFilteredSyncChunk
+
+    :Example:
+        s = Sync(Replica("/tmp/enno.replica"))
+        s.run()
+    """
+    chunk_size = 100
+    """how many entries to ask for in each getFilteredSyncChunk request"""
+
+    @property
+    def note_store(self):
+        if self._note_store is None:
+            self._note_store = self.interface.get_note_store()
+        return self._note_store
+
+    def __init__(self, replica, interface=None, content=False, workers=0):
+        """
+        :param replica: Replica, where the changes will be saved
+        :param interface: EvernoteClient, defaults to get_interface()
+        :param content: bool, True if the content of each changed note should be
+            fetched also, sync chunks never include the note content
+        :param workers: int, if content is True then fetch the content with this
+            many threads
+        """
+        self.replica = replica
+        self.interface = get_interface() if interface is None else interface
+        self._note_store = None
+        self.content = content
+        self.workers = workers
+
+    def run(self):
+        """pull everything that changed since the last run into the replica
+
+        :returns: dict, how many notes, notebooks, tags and expunged guids were
+            saved into the replica
+        """
+        ret = {"notes": 0, "notebooks": 0, "tags": 0, "expunged": 0}
+        replica = self.replica
+
+        # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getSyncState
+        state = self.note_store.getSyncState()
+        if state.fullSyncBefore and state.fullSyncBefore > replica.last_sync:
+            # the server says our copy can't be trusted anymore
+            replica.clear()
+
+        usn = replica.usn
+        sync_filter = NoteStore.SyncChunkFilter(
+            includeNotes=True,
+            includeNoteAttributes=True,
+            includeNotebooks=True,
+            includeTags=True,
+            # expunged guids only matter when there is something to remove them
+            # from
+            includeExpunged=usn > 0,
+        )
+
+        while usn < state.updateCount:
+            chunk = self.note_store.getFilteredSyncChunk(usn, self.chunk_size, sync_filter)
+            self.apply_chunk(chunk, ret)
+
+            if not chunk.chunkHighUSN:
+                break
+
+            usn = chunk.chunkHighUSN
+            replica.usn = usn
+            replica.commit()
+
+        replica.usn = max(usn, replica.usn)
+        replica.last_sync = state.currentTime
+        replica.commit()
+        return ret
+
+    def apply_chunk(self, chunk, counts):
+        """save everything in the chunk into the replica
+
+        :param chunk: NoteStore.SyncChunk
+        :param counts: dict, updated with how many things were saved
+        """
+        replica = self.replica
+
+        if chunk.notebooks:
+            replica.save_notebooks(chunk.notebooks)
+            counts["notebooks"] += len(chunk.notebooks)
+
+        if chunk.tags:
+            replica.save_tags(chunk.tags)
+            counts["tags"] += len(chunk.tags)
+
+        if chunk.notes:
+            if self.content:
+                self.fetch_content(chunk.notes)
+            replica.save_notes(chunk.notes)
+            counts["notes"] += len(chunk.notes)
+
+        for guids, expunge in [
+            (chunk.expungedNotes, replica.expunge_notes),
+            (chunk.expungedNotebooks, replica.expunge_notebooks),
+            (chunk.expungedTags, replica.expunge_tags),
+        ]:
+            if guids:
+                expunge(guids)
+                counts["expunged"] += len(guids)
+
+    def fetch_content(self, notes):
+        """set the content on any of the notes whose content the replica doesn't
+        already have"""
+        notes = [n for n in notes if self.replica.get_content_hash(n.guid) != n.contentHash]
+        if notes:
+            # http://dev.evernote.com/doc/reference/NoteStore.html#Fn_NoteStore_getNoteContent
+            if self.workers:
+                # each thread needs its own note store
+                local = threading.local()
+                def get_content(n):
+                    if getattr(local, "note_store", None) is None:
+                        local.note_store = self.interface.get_note_store()
+                    return local.note_store.getNoteContent(n.guid)
+
+                contents = imap(get_content, notes, self.workers)
+
+            else:
+                contents = (self.note_store.getNoteContent(n.guid) for n in notes)
+
+            for n, content in zip(notes, contents):
+                n.content = content
@@ -1,11 +1,139 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division, print_function, absolute_import
 import re
+import io
+import math
+import codecs
+import functools
+import atexit
+from threading import RLock
+from multiprocessing import Pool
 
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
 from bs4.element import Tag, NavigableString, ProcessingInstruction, Doctype
 
 from .compat import *
+from .cache import ConversionCache
+from . import environ
+
+
+conversion_cache = ConversionCache(environ.CONVERSION_CACHE_SIZE, environ.CONVERSION_CACHE_PATH)
+"""Process wide cache of markup conversions, see cached()"""
+
+
+def get_parser(parser=""):
+    """Returns the name of the BeautifulSoup parser that should be used
+
+    https://www.crummy.com/software/BeautifulSoup/bs4/doc/#installing-a-parser
+
+    lxml is faster but it fixes up malformed markup differently (eg, <p>x<p>y)
+    so it is only used when it is asked for
+
+    :param parser: string, the parser to use if it is installed (eg, lxml), if
+        empty or the parser isn't installed then python's html.parser is used
+    :returns: string, the parser name
+    """
+    for name in [parser, "html.parser"]:
+        if name and builder_registry.lookup(name):
+            return name
+
+
+def cached(method):
+    """Decorator for the Plain conversion methods (eg, ENML.plain()) so the same
+    markup is only converted once while it is in conversion_cache
+
+    a new instance is returned every time so callers never share parsed markup
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not conversion_cache.enabled:
+            return method(self, *args, **kwargs)
+
+        key = conversion_cache.get_key(
+            self,
+            type(self).__name__,
+            method.__name__,
+            args,
+            sorted(kwargs.items()),
+            # parsers disagree on malformed markup
+            get_parser(self.parser) if isinstance(self, HTML) else "",
+        )
+        item = conversion_cache.get(key)
+        if item is None:
+            ret = method(self, *args, **kwargs)
+            # the type is cached by its CONVERT_TYPES name, anything else (eg,
+            # the plain string HTML.plain() returns) is cached as ""
+            name = ""
+            for k, v in CONVERT_TYPES.items():
+                if type(ret) is v:
+                    name = k
+                    break
+            conversion_cache.set(key, (name, unicode(ret)))
+
+        else:
+            name, text = item
+            ret = CONVERT_TYPES.get(name, unicode)(text)
+
+        return ret
+    return wrapper
+
+
+def escape(s, quote=False):
+    """escape the characters that are special in html/xml
+
+    :param s: string, the text to escape
+    :param quote: bool, True to also escape double quotes (eg, for attribute values)
+    :returns: string
+    """
+    s = s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if quote:
+        s = s.replace('"', "&quot;")
+    return s
+
+
+LINE_END_REGEX = re.compile("\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+"""Matches the same line boundaries str.splitlines() does"""
+
+
+def iter_lines(source, encoding="UTF-8"):
+    """yield each line of source without its line ending, this is the same as
+    source.splitlines() but the lines are found as they are needed and source can
+    be an iterable of strings (eg, an open file) that is read a piece at a time
+
+    :param source: string|iterable, the text or the pieces of text, a piece can
+        end in the middle of a line
+    :param encoding: string, used to decode pieces that are bytes
+    :returns: generator, yields each line
+    """
+    if isinstance(source, basestring):
+        source = [source]
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buf = ""
+    for chunk in source:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+
+        buf = buf + chunk if buf else chunk
+        pos = 0
+        for m in LINE_END_REGEX.finditer(buf):
+            if m.end() == len(buf) and m.group(0) == "\r":
+                # the \n of a \r\n could be at the start of the next chunk
+                break
+
+            yield buf[pos:m.start()]
+            pos = m.end()
+        buf = buf[pos:]
+
+    buf += decoder.decode(b"", True)
+    pos = 0
+    for m in LINE_END_REGEX.finditer(buf):
+        yield buf[pos:m.start()]
+        pos = m.end()
+
+    if pos < len(buf):
+        yield buf[pos:]
 
 
 class TypeList(list):
@@ -39,24 +167,62 @@ class Tree(object):
     https://www.crummy.com/software/BeautifulSoup/bs4/doc/
     http://bazaar.launchpad.net/~leonardr/beautifulsoup/bs4/view/head:/bs4/__init__.py
     """
+    WHITESPACE_REGEX = re.compile(r"\s+")
+
+    SKIP_TYPES = (ProcessingInstruction, Doctype)
+
     def __init__(self, soup):
         self.soup = soup
 
     def tags(self):
-        try:
-            for ch in self.soup.children:
-                if isinstance(ch, (ProcessingInstruction, Doctype, BeautifulSoup)):
-                    continue
+        """yield every tag below soup in document (pre-order) order
+
+        this walks the tree with each node's sibling and parent links instead of
+        recursion so really deep documents don't blow the recursion limit. Where
+        to go next is only worked out after a tag is yielded, so the yielded tag
+        can be changed, unwrapped, or removed (eg, decomposed) while the tags are
+        being iterated, an unwrapped tag's children are yielded next and a removed
+        tag's next sibling is still yielded
+        """
+        root = self.soup
+        contents = getattr(root, "contents", None)
+        node = contents[0] if contents else None
+        while node is not None:
+            if isinstance(node, Tag) and not isinstance(node, BeautifulSoup):
+                parent = node.parent
+                prev = node.previous_sibling
+                yield node
+
+                if node.parent is parent:
+                    if node.contents:
+                        node = node.contents[0]
+                    else:
+                        node = self.next_node(node)
 
-                elif isinstance(ch, Tag):
-                    yield ch
-                    t = type(self)(ch)
-                    for gch in t.tags():
-                        yield gch
+                elif prev is not None:
+                    # whatever took the tag's place (eg, its children if it was
+                    # unwrapped) comes right after prev now
+                    node = prev.next_sibling
+                    if node is None:
+                        node = self.next_node(prev)
 
-        except AttributeError:
-            pass
+                elif parent.contents:
+                    node = parent.contents[0]
 
+                else:
+                    node = self.next_node(parent)
+
+            else:
+                node = self.next_node(node)
+
+    def next_node(self, node):
+        """returns the node that comes after node and all its descendants, None
+        if there isn't one below soup"""
+        while node is not None and node is not self.soup:
+            if node.next_sibling is not None:
+                return node.next_sibling
+            node = node.parent
+        return None
 
     def normalize_html_whitespace(self, s):
         """
@@ -64,56 +230,65 @@ class Tree(object):
         https://www.w3.org/TR/CSS21/text.html#white-space-model
         https://www.w3.org/TR/CSS21/visuren.html#inline-formatting
         """
-        s = re.sub("^\s+", " ", Plain(s), re.M)
-        s = re.sub("[\r\n\t]+", " ", s)
-        s = re.sub("\s+", " ", s)
-        return s
-
+        return self.WHITESPACE_REGEX.sub(" ", s)
 
     def plain(self):
-        strings = []
-        is_pre = False
-        if isinstance(self.soup, Tag) and not isinstance(self.soup, BeautifulSoup):
-            is_pre = self.soup.name == "pre"
-
         # this is basically a pre-order tree traversal
         # https://en.wikipedia.org/wiki/Tree_traversal
-        for e in self.soup.children:
-            if isinstance(e, (ProcessingInstruction, Doctype)):
-                continue
+        #
+        # each frame on the stack is [tag, children, strings, is_pre], when all
+        # the children of a tag are done its strings are joined and added to the
+        # strings of its parent
+        soup = self.soup
+        is_pre = isinstance(soup, Tag) and not isinstance(soup, BeautifulSoup) and soup.name == "pre"
+        stack = [[soup, iter(soup.children), [], is_pre]]
+        block_elems = HTML.BLOCK_ELEMS
+        ret = ""
+
+        while stack:
+            frame = stack[-1]
+            strings = frame[2]
+            for e in frame[1]:
+                if isinstance(e, self.SKIP_TYPES):
+                    continue
 
-            elif isinstance(e, NavigableString):
-                if not Plain(e).isspace():
-                    if is_pre:
-                        string = e
+                elif isinstance(e, NavigableString):
+                    if not e.isspace():
+                        if frame[3]:
+                            string = e
 
-                    else:
-                        string = self.normalize_html_whitespace(e)
-                        if strings:
-                            if strings[-1].endswith(" "):
-                                string = string.lstrip()
                         else:
-                            string = string.lstrip()
+                            string = self.normalize_html_whitespace(e)
+                            if not strings or strings[-1].endswith(" "):
+                                string = string.lstrip()
 
-                    strings.append(string)
+                        strings.append(string)
+
+                elif isinstance(e, Tag):
+                    stack.append([e, iter(e.children), [], e.name == "pre"])
+                    break
 
-            elif isinstance(e, Tag):
-                t = type(self)(e)
-                string = t.plain()
-                is_pre = is_pre or e.name == "pre"
-                if not is_pre:
-                    if strings:
-                        if strings[-1].endswith(" "):
+            else:
+                stack.pop()
+                tag = frame[0]
+                string = "".join(strings)
+                if stack:
+                    parent = stack[-1]
+                    strings = parent[2]
+                    parent[3] = parent[3] or tag.name == "pre"
+                    if not parent[3]:
+                        if not strings or strings[-1].endswith(" "):
                             string = string.lstrip()
-                    else:
-                        string = string.lstrip()
 
-                strings.append(string)
+                    strings.append(string)
+
+                    if tag.name in block_elems:
+                        strings.append("\n")
 
-                if e.name in HTML.BLOCK_ELEMS:
-                    strings.append("\n")
+                else:
+                    ret = string
 
-        return "".join(strings)
+        return ret
 
 
 class Plain(unicode):
@@ -132,31 +307,91 @@ class Plain(unicode):
     def plain(self):
         return type(self)(self)
 
-    def html(self):
-        lines = []
-        for line in self.splitlines(False):
-            lines.append("<p>{}</p>".format(line))
-        return HTML("\n".join(lines))
+    @classmethod
+    def iter_html(cls, source, encoding="UTF-8"):
+        """yield the html of source a piece at a time, each line is a paragraph
 
-    def enml(self):
-        """http://dev.evernote.com/doc/articles/enml.php"""
-        lines = []
-        lines.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
-        lines.append('<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">')
-        lines.append("<en-note>")
+        :param source: string|iterable, see iter_lines()
+        :param encoding: string, see iter_lines()
+        :returns: generator, yields strings that together are the html
+        """
+        sep = ""
+        for line in iter_lines(source, encoding):
+            yield "{}<p>{}</p>".format(sep, escape(line))
+            sep = "\n"
+
+    @classmethod
+    def iter_enml(cls, source, encoding="UTF-8"):
+        """yield the ENML of source a piece at a time, each line is a div
+
+        http://dev.evernote.com/doc/articles/enml.php
+
+        :param source: string|iterable, see iter_lines()
+        :param encoding: string, see iter_lines()
+        :returns: generator, yields strings that together are the ENML
+        """
+        yield "\n".join([
+            '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+            '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">',
+            "<en-note>",
+        ])
 
-        for line in self.splitlines(False):
+        for line in iter_lines(source, encoding):
             if line.isspace():
-                lines.append("<div><br /></div>")
+                yield "\n<div><br /></div>"
             else:
-                lines.append("<div>{}</div>".format(line))
+                yield "\n<div>{}</div>".format(escape(line))
 
-        lines.append("</en-note>")
-        return ENML("\n".join(lines))
+        yield "\n</en-note>"
+
+    @classmethod
+    def write(cls, fp, source, to="enml", encoding="UTF-8"):
+        """Convert source and write it to fp as it is converted, so big texts (eg,
+        log files) never have to be in memory all at once
+
+        :Example:
+            with open("big.log") as src, open("big.enml", "w") as dest:
+                Plain.write(dest, src)
+
+        :param fp: file-like, where the html or ENML is written, if it is a binary
+            file the output is encoded with encoding
+        :param source: string|iterable, see iter_lines()
+        :param to: string, either html or enml
+        :param encoding: string, see iter_lines()
+        """
+        if to == "html":
+            pieces = cls.iter_html(source, encoding)
+        elif to == "enml":
+            pieces = cls.iter_enml(source, encoding)
+        else:
+            raise ValueError("Cannot write {}".format(to))
+
+        binary = isinstance(fp, (io.RawIOBase, io.BufferedIOBase))
+        for piece in pieces:
+            fp.write(piece.encode(encoding) if binary else piece)
+
+    @cached
+    def html(self):
+        return HTML("".join(self.iter_html(self)))
+
+    @cached
+    def enml(self, pretty=True):
+        """http://dev.evernote.com/doc/articles/enml.php
+
+        :param pretty: boolean, ignored, plain text's ENML is never indented, this
+            is here so every enml() can be called the same way
+        :returns: ENML
+        """
+        return ENML("".join(self.iter_enml(self)))
 
 
 class HTML(Plain):
 
+    parser = environ.PARSER
+    """The BeautifulSoup parser to use, see get_parser()"""
+
+    XML_DECLARATION_REGEX = re.compile(r"^\s*<\?xml[^>]*\?>", re.I)
+
     BLOCK_ELEMS = set([
         "address",
         "article",
@@ -359,25 +594,63 @@ class HTML(Plain):
 
     @property
     def soup(self):
+        """The parsed markup, the markup is only parsed the first time this is
+        accessed and the same tree is used until release() is called"""
+        soup = self.__dict__.get("_soup")
+        if soup is None:
+            soup = self.parse()
+            self._soup = soup
+        return soup
+
+    def parse(self):
         # https://www.crummy.com/software/BeautifulSoup/
         # docs: https://www.crummy.com/software/BeautifulSoup/bs4/doc/
         # bs4 codebase: http://bazaar.launchpad.net/~leonardr/beautifulsoup/bs4/files
-        soup = BeautifulSoup(self, "html.parser")
+        parser = get_parser(self.parser)
+        markup = self
+        if parser == "lxml":
+            # lxml's html parser turns the xml declaration into text
+            markup = self.XML_DECLARATION_REGEX.sub("", markup, 1)
+        return BeautifulSoup(markup, parser)
+
+    def release(self):
+        """Throw away the parsed markup so its memory can be reclaimed, the markup
+        will be parsed again the next time it is needed"""
+        self._soup = None
+
+    def take_soup(self):
+        """returns the parsed markup for a conversion that changes it (eg, enml()),
+        the tree is released since it won't match the markup anymore"""
+        soup = self.soup
+        self.release()
         return soup
 
-    def enml(self):
-        soup = self.soup
-        tag = self.soup.find("body")
+    @cached
+    def enml(self, pretty=True):
+        """Convert the html to ENML
+
+        :param pretty: boolean, True to indent the ENML so it is easier to read,
+            False to serialize it as compactly as possible (eg, for upload)
+        :returns: ENML
+        """
+        soup = self.take_soup()
+        for elem in list(soup.contents):
+            # the ENML header is added below
+            if isinstance(elem, (ProcessingInstruction, Doctype)):
+                elem.extract()
+
+        tag = soup.find("body")
         if tag is None:
             tag = soup
 
         t = Tree(tag)
         for elem in t.tags():
             if elem.name in self.PERMITTED_ELEMS:
-                for k in elem.attrs.keys():
+                for k in list(elem.attrs.keys()):
                     for kn in self.PROHIBITED_ATTRS:
                         if k.startswith(kn):
                             elem.attrs.pop(k)
+                            break
 
             elif elem.name in self.PROHIBITED_ELEMS:
                 elem.decompose()
@@ -388,20 +661,31 @@ class HTML(Plain):
         if tag.name == "body":
             tag.name = "en-note"
         else:
-            head = tag.new_tag("en-note")
-            head.contents = tag
-            #head.append(tag)
+            head = soup.new_tag("en-note")
+            for elem in list(tag.contents):
+                head.append(elem.extract())
             tag = head
-            #tag = tag.wrap(tag.new_tag("en-note"))
 
         lines = []
         lines.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
         lines.append('<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">')
-        lines.append(tag.prettify())
+        lines.append(tag.prettify() if pretty else tag.decode())
         return ENML("\n".join(lines))
 
+    @cached
+    def sanitize(self):
+        """Same as enml() but the ENML is written as the markup is parsed instead of
+        parsing the markup into a tree first, this is much faster on big documents
+        but the ENML isn't prettified
+
+        :returns: ENML
+        """
+        s = Sanitizer()
+        s.feed(self)
+        return s.close()
+
+    @cached
     def plain(self):
-        soup = self.soup
         elem = Tree(self.soup)
         return elem.plain()
 
@@ -414,15 +698,24 @@ class ENML(HTML):
 
     http://dev.evernote.com/doc/articles/enml.php
     """
-    def enml(self):
+    def enml(self, pretty=True):
         return type(self)(self)
 
-    def html(self):
-        soup = self.soup
+    @cached
+    def html(self, pretty=True):
+        """Convert the ENML to html
+
+        :param pretty: boolean, True to indent the html, False to serialize the
+            contents of <en-note> as they are
+        :returns: HTML
+        """
         tag = self.soup.find("en-note")
         if not tag:
             raise ValueError("ENML does not have <en-note> tag")
 
+        if not pretty:
+            return HTML(tag.decode_contents().strip())
+
         lines = []
         for elem in tag.children:
             if isinstance(elem, Tag):
@@ -436,3 +729,249 @@ class ENML(HTML):
         return HTML("\n".join(lines))
 
 
+class Sanitizer(HTMLParser):
+    """Converts HTML to ENML in one pass as the HTML is parsed, no tree is built so
+    this takes linear time and only the names of the currently open permitted
+    elements are held in memory
+
+    permitted elements are kept without their prohibited attributes, prohibited
+    elements are removed along with everything in them, and any other element is
+    unwrapped (the element is removed but its content is kept)
+
+    https://docs.python.org/3/library/html.parser.html
+    http://dev.evernote.com/doc/articles/enml.php
+
+    :Example:
+        s = Sanitizer()
+        for chunk in chunks:
+            s.feed(chunk)
+        enml = s.close()
+    """
+    VOID_ELEMS = set([
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "embed",
+        "frame",
+        "hr",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    ])
+    """elements that never have content or an end tag"""
+
+    def __init__(self, write=None):
+        """
+        :param write: callable, called with each piece of the ENML as it is
+            written, if None the pieces are kept and close() returns the ENML
+        """
+        if is_py2:
+            HTMLParser.__init__(self)
+        else:
+            HTMLParser.__init__(self, convert_charrefs=True)
+
+        self.pieces = []
+        self.write = self.pieces.append if write is None else write
+        self.permitted_elems = HTML.PERMITTED_ELEMS
+        # html and body are unwrapped so a full document can be sanitized
+        self.prohibited_elems = HTML.PROHIBITED_ELEMS - set(["html", "body"])
+        self.prohibited_attrs = tuple(HTML.PROHIBITED_ATTRS)
+        self.open_elems = []
+        self.skip_elem = None
+        self.skip_depth = 0
+
+        self.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        self.write('<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">\n')
+        self.write("<en-note>")
+
+    def escape(self, s, quote=False):
+        return escape(s, quote)
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_elem:
+            if tag == self.skip_elem:
+                self.skip_depth += 1
+
+        elif tag in self.permitted_elems:
+            parts = ["<", tag]
+            for k, v in attrs:
+                if not k.startswith(self.prohibited_attrs):
+                    parts.append(' {}="{}"'.format(k, self.escape(v or "", quote=True)))
+
+            if tag in self.VOID_ELEMS:
+                parts.append("/>")
+
+            else:
+                parts.append(">")
+                self.open_elems.append(tag)
+
+            self.write("".join(parts))
+
+        elif tag in self.prohibited_elems:
+            if tag not in self.VOID_ELEMS:
+                self.skip_elem = tag
+                self.skip_depth = 1
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.VOID_ELEMS:
+            self.handle_starttag(tag, attrs)
+
+        else:
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.skip_elem:
+            if tag == self.skip_elem:
+                self.skip_depth -= 1
+                if self.skip_depth == 0:
+                    self.skip_elem = None
+
+        elif tag in self.open_elems:
+            # close any elements that were left open inside this one
+            while self.open_elems:
+                name = self.open_elems.pop()
+                self.write("</{}>".format(name))
+                if name == tag:
+                    break
+
+    def handle_data(self, data):
+        if not self.skip_elem:
+            self.write(self.escape(data))
+
+    def handle_entityref(self, name):
+        # only called by python 2's HTMLParser
+        if not self.skip_elem:
+            self.write("&{};".format(name))
+
+    def handle_charref(self, name):
+        # only called by python 2's HTMLParser
+        if not self.skip_elem:
+            self.write("&#{};".format(name))
+
+    def close(self):
+        """finish the ENML
+
+        :returns: ENML, if write was given when the instance was created then the
+            ENML was written there and this returns None
+        """
+        HTMLParser.close(self)
+        while self.open_elems:
+            self.write("</{}>".format(self.open_elems.pop()))
+        self.write("</en-note>")
+        return ENML("".join(self.pieces)) if self.pieces else None
+
+
+def convert(doc, to="plain", doc_class=None):
+    """Convert doc to another format
+
+    :param doc: string, the markup to convert, if it is a Plain (or HTML or ENML)
+        instance then it is converted from that type
+    :param to: string, the format to convert to, one of plain, html, or enml
+    :param doc_class: type, the type of doc if it is a plain string, defaults to ENML
+    :returns: Plain|HTML|ENML, depending on to
+    """
+    if to not in CONVERT_TYPES:
+        raise ValueError("Cannot convert to {}".format(to))
+
+    if not isinstance(doc, Plain):
+        doc = (doc_class or ENML)(doc)
+    # some conversions (eg, HTML.plain()) return a plain string
+    return CONVERT_TYPES[to](getattr(doc, to)())
+
+
+def convert_args(args):
+    """Pool callback for convert_many(), the converted doc is returned as a plain
+    string so it is cheap to send back to the parent process"""
+    doc, to, doc_class = args
+    return unicode(convert(doc, to, doc_class))
+
+
+CONVERT_TYPES = {"plain": Plain, "html": HTML, "enml": ENML}
+"""The type convert() returns for each format it can convert to"""
+
+pools = {}
+"""The process pools convert_many() uses, by how many workers they have"""
+
+pools_lock = RLock()
+
+
+def get_pool(workers):
+    """returns the shared process pool with workers processes, the pool is created
+    the first time it is needed and then kept so each convert_many() call doesn't
+    pay to start and stop its processes
+
+    :param workers: int, how many processes the pool has
+    :returns: multiprocessing.Pool
+    """
+    with pools_lock:
+        pool = pools.get(workers)
+        if pool is None:
+            pool = Pool(workers)
+            pools[workers] = pool
+        return pool
+
+
+@atexit.register
+def close_pools():
+    """terminate the shared pools, this is called when the interpreter exits"""
+    with pools_lock:
+        for pool in pools.values():
+            pool.terminate()
+        pools.clear()
+
+
+def convert_many(docs, to="plain", workers=0, chunksize=0, doc_class=None, pool=None):
+    """Convert all the docs, this is the same as calling convert() on each doc but
+    if workers is set the conversions are spread across a pool of processes
+    since parsing and converting markup is cpu bound
+
+    :Example:
+        plains = list(convert_many(contents, workers=8))
+
+    :param docs: iterable, the docs to convert, see convert()
+    :param to: string, the format to convert to, one of plain, html, or enml
+    :param workers: int, how many processes to use, 0 converts in this process,
+        the processes are kept in a shared pool, see get_pool()
+    :param chunksize: int, how many docs are sent to a process at a time, 0 means
+        the docs are split into about 4 chunks per process
+    :param doc_class: type, passed to convert()
+    :param pool: multiprocessing.Pool, convert with this pool instead of the
+        shared one, the caller owns it so it is left running
+    :returns: generator, yields the converted docs in the same order as docs, they
+        are the same type convert() returns whether workers is set or not
+    """
+    if to not in CONVERT_TYPES:
+        raise ValueError("Cannot convert to {}".format(to))
+
+    if pool is None and workers and workers > 1:
+        pool = get_pool(workers)
+
+    if pool is not None:
+        if not chunksize:
+            # Pool doesn't have a public way to ask how many processes it has
+            workers = workers or getattr(pool, "_processes", 0) or 1
+            docs = list(docs)
+            chunksize = int(math.ceil(len(docs) / (workers * 4))) or 1
+
+        args = (
+            (unicode(doc), to, type(doc) if isinstance(doc, Plain) else doc_class)
+            for doc in docs
+        )
+        rtype = CONVERT_TYPES[to]
+        for ret in pool.imap(convert_args, args, chunksize):
+            yield rtype(ret)
+
+    else:
+        for doc in docs:
+            yield convert(doc, to, doc_class)
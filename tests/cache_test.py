@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from unittest import TestCase
+import time
+
+import testdata
+
+from enno.cache import LRUCache, TTLCache, ContentCache, ConversionCache
+
+
+class LRUCacheTest(TestCase):
+    def test_size(self):
+        c = LRUCache(2)
+        c["foo"] = 1
+        c["bar"] = 2
+        self.assertEqual(1, c["foo"])
+
+        c["che"] = 3
+        self.assertEqual(2, len(c))
+        self.assertTrue("foo" in c)
+        self.assertTrue("che" in c)
+        self.assertFalse("bar" in c)
+        with self.assertRaises(KeyError):
+            c["bar"]
+
+    def test_unbounded(self):
+        c = LRUCache()
+        for i in range(100):
+            c[i] = i
+        self.assertEqual(100, len(c))
+
+
+class TTLCacheTest(TestCase):
+    def test_ttl(self):
+        c = TTLCache(ttl=0.5)
+        c["foo"] = 1
+        self.assertEqual(1, c.get("foo"))
+        self.assertTrue("foo" in c)
+
+        time.sleep(0.6)
+        self.assertIsNone(c.get("foo"))
+        self.assertFalse("foo" in c)
+
+    def test_off(self):
+        c = TTLCache(ttl=0)
+        c["foo"] = 1
+        self.assertIsNone(c.get("foo"))
+
+    def test_pop(self):
+        c = TTLCache(ttl=10)
+        c["foo"] = 1
+        self.assertEqual(1, c.pop("foo"))
+        self.assertIsNone(c.pop("foo"))
+
+
+class ContentCacheTest(TestCase):
+    def test_usn(self):
+        c = ContentCache(testdata.create_dir())
+        guid = testdata.get_uuid()
+        c.set(guid, "<en-note>foo</en-note>", usn=10, account="foo")
+        self.assertEqual("<en-note>foo</en-note>", c.get(guid, usn=10, account="foo"))
+        self.assertIsNone(c.get(guid, usn=11, account="foo"))
+        self.assertIsNone(c.get(guid, account="foo"))
+        self.assertIsNone(c.get(testdata.get_uuid(), usn=10, account="foo"))
+
+    def test_content_hash(self):
+        c = ContentCache(testdata.create_dir(), compress=True)
+        guid = testdata.get_uuid()
+        content = testdata.get_unicode_words()
+        c.set(guid, content, account="foo")
+        self.assertEqual(content, c.get(guid, ContentCache.get_content_hash(content), account="foo"))
+        self.assertIsNone(c.get(guid, ContentCache.get_content_hash("foo"), account="foo"))
+
+        c.pop(guid, account="foo")
+        self.assertIsNone(c.get(guid, ContentCache.get_content_hash(content), account="foo"))
+
+    def test_account(self):
+        c = ContentCache(testdata.create_dir())
+        guid = testdata.get_uuid()
+        c.set(guid, "foo", usn=1, account="foo")
+        c.set(guid, "bar", usn=1, account="bar")
+        self.assertEqual("foo", c.get(guid, usn=1, account="foo"))
+        self.assertEqual("bar", c.get(guid, usn=1, account="bar"))
+
+        c.set(guid, "che", usn=1)
+        self.assertIsNone(c.get(guid, usn=1))
+
+        class Interface(object): pass
+        i = Interface()
+        self.assertIsNone(ContentCache.get_account(i))
+        i.path = ":memory:"
+        self.assertIsNone(ContentCache.get_account(i))
+        i.path = "/tmp/enno.sqlite"
+        self.assertTrue(ContentCache.get_account(i).startswith("store-"))
+        i.token = "S=s1:U=1A2b:E=123:C=456:P=1cd:A=en-devtoken:V=2:H=789"
+        self.assertEqual("user-1a2b", ContentCache.get_account(i))
+        i.token = "foo"
+        account = ContentCache.get_account(i)
+        self.assertTrue(account.startswith("token-"))
+        self.assertFalse("foo" in account)
+
+    def test_corrupt(self):
+        c = ContentCache(testdata.create_dir())
+        guid = testdata.get_uuid()
+        c.set(guid, "foo", usn=1, account="foo")
+        with open(c.get_path(guid, "foo"), "wb") as fp:
+            fp.write(b"z")
+        self.assertIsNone(c.get(guid, usn=1, account="foo"))
+
+    def test_off(self):
+        c = ContentCache()
+        guid = testdata.get_uuid()
+        c.set(guid, "foo", usn=1, account="foo")
+        self.assertIsNone(c.get(guid, usn=1, account="foo"))
+
+
+class ConversionCacheTest(TestCase):
+    def test_key(self):
+        k = ConversionCache.get_key("<en-note>foo</en-note>", "ENML", "plain")
+        self.assertEqual(k, ConversionCache.get_key("<en-note>foo</en-note>", "ENML", "plain"))
+        self.assertNotEqual(k, ConversionCache.get_key("<en-note>foo</en-note>", "ENML", "html"))
+        self.assertNotEqual(k, ConversionCache.get_key("<en-note>bar</en-note>", "ENML", "plain"))
+
+    def test_size(self):
+        c = ConversionCache(2)
+        c.set("foo", 1)
+        c.set("bar", 2)
+        c.set("che", 3)
+        self.assertIsNone(c.get("foo"))
+        self.assertEqual(3, c.get("che"))
+
+    def test_path(self):
+        path = testdata.create_dir()
+        c = ConversionCache(1, path)
+        c.set("foo", ("plain", "1"))
+        c.set("bar", ("html", "<p>\u00e9\n2</p>"))
+        self.assertEqual(1, len(c))
+        self.assertEqual(("plain", "1"), c.get("foo"))
+
+        c = ConversionCache(path=path)
+        self.assertEqual(("html", "<p>\u00e9\n2</p>"), c.get("bar"))
+        self.assertTrue("foo" in c)
+        self.assertEqual(0, len(c))
+
+        c.pop("foo")
+        self.assertFalse("foo" in c)
+        c.clear()
+        self.assertIsNone(c.get("bar"))
+
+    def test_corrupt(self):
+        path = testdata.create_dir()
+        c = ConversionCache(path=path)
+        c.set("foo", ("plain", "1"))
+        with open(c.get_path("foo"), "wb") as fp:
+            fp.write(b"\xff\xfe")
+        self.assertIsNone(c.get("foo"))
+
+    def test_off(self):
+        c = ConversionCache()
+        self.assertFalse(c.enabled)
+        c.set("foo", 1)
+        self.assertIsNone(c.get("foo"))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from unittest import TestCase
+
+import testdata
+from evernote.edam.type.ttypes import Note as EvernoteNote
+
+from enno.model import Note
+from enno.index import Index, Tokenizer
+from enno.utils import Plain
+
+
+class IndexTest(TestCase):
+    def get_index(self, count=10):
+        index = Index(testdata.create_dir())
+        guids = []
+        for i in range(count):
+            n = EvernoteNote(
+                guid=testdata.get_uuid(),
+                title="title {}{}".format(i, " foo" if i % 2 else ""),
+                content=Plain("content {} bar che{}".format(i, " baz boom" if i < 3 else "")).enml(),
+            )
+            index.add(n)
+            guids.append(n.guid)
+        return index, guids
+
+    def test_tokens(self):
+        t = Tokenizer()
+        self.assertEqual(["foo", "bar", "1"], t.tokens("Foo, bar-1."))
+        self.assertEqual([], t.tokens(None))
+
+    def test_search(self):
+        index, guids = self.get_index()
+
+        self.assertEqual(guids[1::2], index.search(Note.query.in_title("foo")))
+        self.assertEqual(guids[0::2], index.search(Note.query.nin_title("foo")))
+        self.assertEqual(guids, index.search(Note.query.in_note("bar")))
+        self.assertEqual([guids[5]], index.search(Note.query.in_note("5")))
+        self.assertEqual([], index.search(Note.query.in_title("bar")))
+        self.assertEqual(guids[:3], index.search(Note.query.in_note("baz boom")))
+        self.assertEqual([], index.search(Note.query.in_note("boom baz")))
+        self.assertEqual(
+            [guids[1], guids[3]],
+            index.search(Note.query.any_note("1", "3"))
+        )
+        self.assertEqual(
+            [guids[3], guids[5], guids[7], guids[9]],
+            index.search(Note.query.in_title("foo").nin_note("1"))
+        )
+        self.assertEqual(guids[1:3], index.search("any: 1 2"))
+        self.assertEqual(guids, index.search("ba*"))
+        self.assertEqual(guids[:3], index.search("bo*"))
+        self.assertEqual(guids[:3], index.search('"baz bo*"'))
+        self.assertEqual([], index.search('"boom ba*"'))
+
+        self.assertEqual(
+            sorted(guids[0::2] + [guids[1]], key=guids.index),
+            index.search("any: 1 -intitle:foo")
+        )
+
+        index.remove(guids[0])
+        self.assertEqual(guids[2::2], index.search("-intitle:foo"))
+        self.assertEqual(guids[1:], index.search("bar"))
+
+        with self.assertRaises(ValueError):
+            index.search("tag:foo")
+
+    def test_commit(self):
+        index, guids = self.get_index()
+        index.commit()
+        self.assertEqual(1, len(index.segments))
+
+        n = EvernoteNote(guid=guids[0], title="new title", content=Plain("new content").enml())
+        index.add(n)
+        index.remove(guids[1])
+        index.commit()
+        self.assertEqual(2, len(index.segments))
+
+        index = Index(index.path)
+        self.assertEqual([guids[0]], index.search("new"))
+        self.assertEqual(guids[2:], index.search("bar"))
+        self.assertEqual([guids[0]], index.search("intitle:new"))
+
+        index.merge()
+        self.assertEqual(1, len(index.segments))
+        index = Index(index.path)
+        self.assertEqual(guids[2:], index.search("bar"))
+        self.assertEqual(guids[2:] + [guids[0]], index.search("content"))
+        self.assertEqual(9, len(index.guids))
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from unittest import TestCase
+import datetime
+import calendar
+from multiprocessing import Pool
+
+import testdata
+from evernote.edam.type.ttypes import \
+    Notebook as EvernoteNotebook, \
+    Note as EvernoteNote, \
+    Tag as EvernoteTag
+
+from enno.model import Note, Notebook, Tag, content_cache
+from enno.mirror import Mirror
+from enno.query import TagQuery, list_cache
+from enno.utils import Plain
+
+
+class MirrorTest(TestCase):
+    def get_timestamp(self, dt):
+        return calendar.timegm(dt.utctimetuple()) * 1000
+
+    def get_mirror(self, count=20):
+        m = Mirror(testdata.get_file("enno.sqlite"))
+
+        nbs = [
+            EvernoteNotebook(guid=testdata.get_uuid(), name="nb {}".format(i), updateSequenceNum=i)
+            for i in range(2)
+        ]
+        m.save_notebooks(nbs)
+
+        tags = [
+            EvernoteTag(guid=testdata.get_uuid(), name="tag {}".format(i), updateSequenceNum=i)
+            for i in range(3)
+        ]
+        m.save_tags(tags)
+
+        notes = []
+        start = datetime.datetime(2017, 1, 1)
+        for i in range(count):
+            dt = start + datetime.timedelta(days=i)
+            notes.append(EvernoteNote(
+                guid=testdata.get_uuid(),
+                title="title {}{}".format(i, " foo" if i % 2 else ""),
+                content=Plain("content {} bar".format(i)).enml(),
+                contentHash=testdata.get_ascii(16).encode("utf-8"),
+                created=self.get_timestamp(dt),
+                updated=self.get_timestamp(dt),
+                notebookGuid=nbs[i % 2].guid,
+                tagGuids=[tags[i % 3].guid],
+                updateSequenceNum=i + 10,
+            ))
+        m.save_notes(notes)
+        m.usn = count + 10
+        m.commit()
+        return m
+
+    def test_query(self):
+        m = self.get_mirror()
+
+        ns = Note.query.use(m).in_title("foo").get()
+        self.assertEqual(10, len(ns))
+        for n in ns:
+            self.assertTrue("foo" in n.title)
+
+        ns = Note.query.use(m).nin_title("foo").get()
+        self.assertEqual(10, len(ns))
+
+        ns = Note.query.use(m).is_notebook("nb 1").get()
+        self.assertEqual(10, len(ns))
+        for n in ns:
+            self.assertEqual("nb 1", n.notebook.name)
+
+        ns = Note.query.use(m).gt_created(datetime.datetime(2017, 1, 11)).get()
+        self.assertEqual(10, len(ns))
+
+        ns = Note.query.use(m).lt_created(datetime.date(2017, 1, 11)).get()
+        self.assertEqual(10, len(ns))
+
+        ns = Note.query.use(m).in_note("bar").limit(5).offset(2).asc().get()
+        self.assertEqual(5, len(ns))
+        self.assertEqual("title 2", ns[0].title)
+
+        self.assertEqual(20, Note.query.use(m).count())
+        self.assertEqual(20, len(list(Note.query.use(m).all())))
+
+    def test_query_words(self):
+        m = self.get_mirror(0)
+        m.save_notes([
+            EvernoteNote(
+                guid=testdata.get_uuid(),
+                title=title,
+                content=Plain(title).enml(),
+                contentHash=testdata.get_ascii(16).encode("utf-8"),
+                active=True,
+            ) for title in ["cat food", "concatenate", "catalog"]
+        ])
+
+        ns = Note.query.use(m).in_title("cat").get()
+        self.assertEqual(["cat food"], [n.title for n in ns])
+
+        ns = Note.query.use(m).in_note("cat").get()
+        self.assertEqual(["cat food"], [n.title for n in ns])
+
+        ns = Note.query.use(m).search("cat*").get()
+        self.assertEqual(set(["cat food", "catalog"]), set(n.title for n in ns))
+
+        ns = Note.query.use(m).in_title("at food").get()
+        self.assertEqual(0, len(ns))
+
+        # punctuation has no words so it doesn't filter anything, same as Predicate
+        self.assertEqual(3, Note.query.use(m).search("intitle:-").count())
+
+    def test_query_prefix_names(self):
+        m = self.get_mirror(6)
+        m.save_tags([EvernoteTag(guid=testdata.get_uuid(), name="other", updateSequenceNum=3)])
+
+        self.assertEqual(6, Note.query.use(m).search("tag:tag*").count())
+        self.assertEqual(6, Note.query.use(m).search("tag:TAG*").count())
+        self.assertEqual(2, Note.query.use(m).search('tag:"tag 1"').count())
+        self.assertEqual(0, Note.query.use(m).search("tag:ta").count())
+        self.assertEqual(0, Note.query.use(m).search("-tag:t*").count())
+
+        self.assertEqual(6, Note.query.use(m).search("notebook:nb*").count())
+        self.assertEqual(0, Note.query.use(m).search("notebook:nb").count())
+
+    def test_words_columns_added(self):
+        path = testdata.get_file("enno.sqlite")
+        m = Mirror(path)
+        m.save_notes([EvernoteNote(
+            guid=testdata.get_uuid(),
+            title="cat food",
+            content=Plain("dog food").enml(),
+            active=True,
+        )])
+        # a mirror from before the words columns existed
+        m.execute(" ".join([
+            "CREATE TABLE old_notes AS SELECT guid, title, notebook_guid, created, updated,",
+            "usn, active, content_hash, content, plain, struct FROM notes",
+        ]))
+        m.execute("DROP TABLE notes")
+        m.execute("ALTER TABLE old_notes RENAME TO notes")
+        m.commit()
+        m.close()
+
+        m = Mirror(path)
+        self.assertEqual(1, Note.query.use(m).in_title("cat").count())
+        self.assertEqual(1, Note.query.use(m).in_note("dog").count())
+
+    def test_hydrate(self):
+        m = self.get_mirror()
+        n = Note.query.use(m).in_note("content 3").one()
+        self.assertTrue("content 3 bar" in n.plain)
+        self.assertEqual(1, len(n.tags))
+        self.assertEqual(n.tag_guids[0], n.tags[0].guid)
+
+    def test_select(self):
+        m = self.get_mirror()
+        n = Note.query.use(m).select("title").in_title("title 3").one()
+        self.assertIsNone(n.struct.created)
+        self.assertEqual("title 3 foo", n.title)
+        self.assertFalse(n._hydrated)
+
+        # created wasn't selected so the note has to be loaded, but not its content
+        self.assertIsNotNone(n.created)
+        self.assertFalse(n._hydrated)
+        self.assertIsNone(n.struct.content)
+
+        n = Note.query.use(m).select("title", "deleted").in_title("title 3").one()
+        self.assertIsNone(n.deleted)
+        self.assertFalse(n._hydrated)
+
+    def test_hydrate_tiers(self):
+        m = self.get_mirror()
+        calls = []
+        def track(name):
+            orig = getattr(m, name)
+            def method(*args, **kwargs):
+                calls.append(name)
+                return orig(*args, **kwargs)
+            setattr(m, name, method)
+        track("getNote")
+        track("getNoteContent")
+
+        n = Note.query.use(m).select("title").in_title("title 3").one()
+        self.assertIsNone(n.deleted)
+        self.assertIsNone(n.deleted)
+        self.assertIsNone(n.attributes)
+        self.assertEqual(["getNote"], calls)
+
+        self.assertTrue("content 3" in n.plain)
+        self.assertTrue("content 3" in n.plain)
+        self.assertEqual(["getNote", "getNoteContent"], calls)
+        self.assertTrue(n._hydrated)
+
+        n = Note.query.use(m).in_title("title 5").one()
+        self.assertTrue("content 5" in n.plain)
+        self.assertEqual(["getNote", "getNoteContent", "getNoteContent"], calls)
+        self.assertEqual("title 5 foo", n.title)
+        self.assertIsNone(n.deleted)
+        self.assertEqual(["getNote", "getNoteContent", "getNoteContent", "getNote"], calls)
+        self.assertTrue("content 5" in n.plain)
+        self.assertEqual(4, len(calls))
+
+    def test_iterator_hydrate(self):
+        m = self.get_mirror()
+        ns = Note.query.use(m).get(limit=10).hydrate(workers=4)
+        for n in ns:
+            self.assertIsNotNone(n.struct.content)
+            self.assertFalse(n._hydrated)
+
+        ns = Note.query.use(m).limit(5).all().hydrate(workers=2, metadata=True)
+        count = 0
+        for n in ns:
+            self.assertIsNotNone(n.struct.content)
+            self.assertTrue(n._hydrated)
+            count += 1
+        self.assertEqual(20, count)
+
+    def test_iterator_convert(self):
+        m = self.get_mirror()
+        ns = Note.query.use(m).asc().get(limit=5).hydrate()
+        plains = ns.convert(workers=2)
+        self.assertEqual(5, len(plains))
+        for i, plain in enumerate(plains):
+            self.assertEqual("content {} bar".format(i), plain.strip())
+
+        self.assertEqual(plains, ns.convert())
+
+        pool = Pool(2)
+        try:
+            self.assertEqual(plains, ns.convert(pool=pool))
+        finally:
+            pool.terminate()
+
+    def test_iterator_resolve_pages(self):
+        m = self.get_mirror()
+        ns = Note.query.use(m).limit(5).all()
+
+        # nothing to resolve so the models aren't built
+        page = ns._get_page(5)
+        self.assertFalse(any(isinstance(n, Note) for n in list.__iter__(page)))
+
+        ns.resolve()
+        page = ns._get_page(10)
+        self.assertTrue(all(isinstance(n, Note) for n in list.__iter__(page)))
+        for n in page:
+            self.assertEqual(n.tag_guids[0], n.tags[0].guid)
+            self.assertEqual(n.notebook_guid, n.notebook.guid)
+
+    def test_content_cache(self):
+        m = self.get_mirror()
+        calls = []
+        get_content = m.getNoteContent
+        def getNoteContent(guid):
+            calls.append(guid)
+            return get_content(guid)
+        m.getNoteContent = getNoteContent
+
+        path = content_cache.path
+        content_cache.path = testdata.create_dir()
+        try:
+            n = Note.query.use(m).in_title("title 3").one()
+            self.assertTrue("content 3" in n.plain)
+            self.assertEqual(1, len(calls))
+
+            n = Note.query.use(m).in_title("title 3").one()
+            self.assertTrue("content 3" in n.plain)
+            self.assertEqual(1, len(calls))
+
+            # a new usn means the note changed
+            n = Note.query.use(m).in_title("title 3").one()
+            n.struct.updateSequenceNum += 1
+            self.assertTrue("content 3" in n.plain)
+            self.assertEqual(2, len(calls))
+
+        finally:
+            content_cache.path = path
+
+    def test_in_guid_cached_list(self):
+        m = self.get_mirror()
+        tags = list(Tag.query.use(m).get())
+        self.assertEqual(3, len(tags))
+
+        # another client creates a tag while the old list is still cached
+        index = list_cache.get(TagQuery._get_list_key(m))
+        et = EvernoteTag(guid=testdata.get_uuid(), name="tag 3", updateSequenceNum=3)
+        m.save_tags([et])
+        list_cache.set(TagQuery._get_list_key(m), index)
+
+        ts = list(Tag.query.use(m).in_guid(tags[0].guid, et.guid).get())
+        self.assertEqual(set([tags[0].guid, et.guid]), set(t.guid for t in ts))
+
+        calls = []
+        def track(name):
+            orig = getattr(m, name)
+            def method(*args, **kwargs):
+                calls.append(name)
+                return orig(*args, **kwargs)
+            setattr(m, name, method)
+        track("listTags")
+        track("getTag")
+
+        ts = list(Tag.query.use(m).in_guid(tags[0].guid, et.guid).get())
+        self.assertEqual(2, len(ts))
+        self.assertEqual([], calls)
+
+        # a guid that doesn't exist is only looked up once while the list is cached
+        missing = testdata.get_uuid()
+        for i in range(3):
+            ts = list(Tag.query.use(m).in_guid(tags[1].guid, missing).get())
+            self.assertEqual([tags[1].guid], [t.guid for t in ts])
+        self.assertEqual(["getTag"], calls)
+
+        t = Tag.query.use(m).startswith_name("tag 3").one()
+        self.assertEqual(et.guid, t.guid)
+
+    def test_state(self):
+        path = testdata.get_file("enno.sqlite")
+        m = Mirror(path)
+        self.assertEqual(0, m.usn)
+        m.usn = 10
+        m.commit()
+
+        m = Mirror(path)
+        self.assertEqual(10, m.usn)
+
+    def test_expunge(self):
+        m = self.get_mirror()
+        n = Note.query.use(m).one()
+        m.expunge_notes([n.guid])
+        self.assertEqual(19, Note.query.use(m).count())
+
+    def test_notebooks(self):
+        m = self.get_mirror()
+        nbs = list(Notebook.query.use(m).get())
+        self.assertEqual(2, len(nbs))
+
+        nb = Notebook.query.use(m).is_name("NB 1").one()
+        self.assertEqual("nb 1", nb.name)
+
+        m.save_notebooks([EvernoteNotebook(guid=testdata.get_uuid(), name="nb 2")])
+        self.assertEqual(3, len(list(Notebook.query.use(m).get())))
+
+        self.assertEqual(3, len(list(Tag.query.use(m).get())))
@@ -4,6 +4,7 @@ from unittest import TestCase
 import time
 
 import testdata
+from evernote.edam.type.ttypes import Note as EvernoteNote
 
 from enno.model import Notebook, Note, Tag
 from enno.utils import HTML
@@ -89,10 +90,30 @@ class NoteTest(TestCase):
         html = "<p>{}</p>".format(testdata.get_words())
         n.html = html
         self.assertFalse(plain in n.content)
-        self.assertTrue(HTML(html).plain() in n.content)
+        self.assertTrue(HTML(html).plain().strip() in n.content)
 
         # TODO -- test & in note
 
+    def test_save_content(self):
+        """fetched content is uploaded exactly as it was fetched"""
+        class NoteStore(object):
+            def updateNote(self, struct):
+                self.struct = struct
+                return struct
+
+        content = "\n".join([
+            '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+            '<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">',
+            '<en-note><div style="white-space: pre-wrap;">def f():\n    return   1</div></en-note>',
+        ])
+        note_store = NoteStore()
+        n = Note(EvernoteNote(guid=testdata.get_uuid(), title="foo", content=content))
+        n.use(note_store)
+        n.title = "bar"
+        n.save()
+        self.assertEqual(content, note_store.struct.content)
+        self.assertEqual("bar", note_store.struct.title)
+
     def test_html(self):
         n = Note()
         nb = testdata.random.choice(list(Notebook.query.get()))
@@ -172,6 +193,17 @@ class NotebookTest(TestCase):
         self.assertEqual(name2, nb.name)
         self.assertNotEqual(updated, nb.updated)
 
+    def test_list_cache(self):
+        names = [nb.name for nb in self.get_query().get()]
+
+        instance = self.create_instance(name=testdata.get_words(1))
+        instance.save()
+
+        # inserting should have cleared the cached list
+        names2 = [nb.name for nb in self.get_query().get()]
+        self.assertEqual(len(names) + 1, len(names2))
+        self.assertTrue(instance.name in names2)
+
     def test_query(self):
         names = [nb.name for nb in self.get_query().get()]
 
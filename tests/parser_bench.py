@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Compare how long html.parser and lxml take to convert typical notes, this isn't
+part of the test suite since the timings depend on the machine
+
+    $ python -m tests.parser_bench
+"""
+from __future__ import unicode_literals, division, print_function, absolute_import
+import time
+
+from enno.utils import get_parser
+from .utils_test import get_parser_docs, convert_with
+
+
+def main(rounds=5):
+    if get_parser("lxml") != "lxml":
+        print("lxml is not installed")
+        return
+
+    docs = get_parser_docs()
+    timings = {}
+    for parser in ["html.parser", "lxml"]:
+        start = time.time()
+        for i in range(rounds):
+            for doc in docs:
+                convert_with(doc, parser)
+        timings[parser] = time.time() - start
+
+    for parser, elapsed in timings.items():
+        print("{}: {:.3f}s".format(parser, elapsed))
+    print("lxml took {:.2f}x as long as html.parser".format(
+        timings["lxml"] / timings["html.parser"]
+    ))
+
+
+if __name__ == "__main__":
+    main()
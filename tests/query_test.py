@@ -5,10 +5,36 @@ import random
 
 import testdata
 
-from enno.query import NoteQuery, NotebookQuery
+from enno.query import NoteQuery, NotebookQuery, NoteSpec, ResultCache, result_cache
 from enno.model import Note, Notebook
 
 
+class ResultCacheTest(TestCase):
+    def test_interval(self):
+        class State(object):
+            updateCount = 1
+
+        class NoteStore(object):
+            calls = 0
+            def getSyncState(self):
+                self.calls += 1
+                return State()
+
+        note_store = NoteStore()
+        c = ResultCache(10, interval=60)
+        c.validate("foo", note_store)
+        c.set(("foo", 1), "bar")
+        c.validate("foo", note_store)
+        self.assertEqual(1, note_store.calls)
+        self.assertEqual("bar", c.get(("foo", 1)))
+
+        c.interval = 0
+        State.updateCount = 2
+        c.validate("foo", note_store)
+        self.assertEqual(2, note_store.calls)
+        self.assertIsNone(c.get(("foo", 1)))
+
+
 class NotebookQueryTest(TestCase):
     def get_query(self):
         return Notebook.query
@@ -19,6 +45,26 @@ class NotebookQueryTest(TestCase):
         nb1 = self.get_query().is_name(nb.name).one()
         self.assertEqual(nb.name, nb1.name)
 
+    def test_name_index(self):
+        nbs = list(self.get_query().get())
+        nb = random.choice(nbs)
+        name = nb.name.lower()
+
+        r = [x.guid for x in self.get_query().is_name(name.upper()).get()]
+        self.assertEqual([nb.guid], r)
+
+        prefix = name[:2]
+        r = [x.guid for x in self.get_query().startswith_name(prefix).get()]
+        r2 = [x.guid for x in nbs if x.name.lower().startswith(prefix)]
+        self.assertEqual(r2, r)
+
+        r = [x.guid for x in self.get_query().contains_name(name[1:]).get()]
+        r2 = [x.guid for x in nbs if name[1:] in x.name.lower()]
+        self.assertEqual(r2, r)
+
+        r = [x.guid for x in self.get_query().in_guid(*[x.guid for x in nbs]).get()]
+        self.assertEqual([x.guid for x in nbs], r)
+
     def test_all_names(self):
         raise self.skipTest("This uses a lot of api requests")
         nbs = list(self.get_query().get())
@@ -36,6 +82,24 @@ class NoteQueryTest(TestCase):
         r2 = self.get_query().is_guid(r1.guid).one()
         self.assertEqual(r1.guid, r2.guid)
 
+    def test_in_guid_workers(self):
+        guids = [n.guid for n in self.get_query().limit(10).get()]
+        guids.reverse()
+
+        ns = self.get_query().in_guid(*guids).get()
+        self.assertEqual(guids, [n.guid for n in ns])
+
+        ns = self.get_query().in_guid(*guids).get(workers=3)
+        self.assertEqual(guids, [n.guid for n in ns])
+
+        ns = self.get_query().in_guid(*guids).get(
+            workers=3,
+            note_spec=NoteSpec(includeContent=True)
+        )
+        self.assertEqual(guids, [n.guid for n in ns])
+        for n in ns:
+            self.assertIsNotNone(n.struct.content)
+
     def test_sort_order_1(self):
         q = self.get_query()
         r1 = q.limit(1).desc().get()
@@ -131,6 +195,117 @@ class NoteQueryTest(TestCase):
             all_count += 1
         self.assertEqual(count, all_count)
 
+    def test_all_prefetch(self):
+        guids = [n.guid for n in self.get_query().all()]
+        guids2 = [n.guid for n in self.get_query().all(prefetch=2)]
+        self.assertEqual(guids, guids2)
+
+        # stopping early shouldn't hang the background thread
+        for i, n in enumerate(self.get_query().all(prefetch=2)):
+            if i > 10:
+                break
+
+    def test_all_workers(self):
+        guids = [n.guid for n in self.get_query().all()]
+        guids2 = [n.guid for n in self.get_query().all(workers=4)]
+        self.assertEqual(guids, guids2)
+
+        guids3 = [n.guid for n in self.get_query().all(workers=4, ordered=False)]
+        self.assertEqual(len(guids), len(guids3))
+        self.assertEqual(set(guids), set(guids3))
+
+    def test_all_page_cache(self):
+        ns = self.get_query().all()
+        count = self.get_query().count()
+        if count <= 250:
+            raise self.skipTest("Need more than one page of notes")
+
+        n = ns[count - 1]
+        self.assertEqual(1, len(ns.page_cache))
+
+        # the page should come out of the cache this time
+        n2 = ns[count - 1]
+        self.assertEqual(n.guid, n2.guid)
+        self.assertEqual(1, len(ns.page_cache))
+
+        ns2 = ns[count - 2:count]
+        self.assertEqual(n.guid, ns2[-1].guid)
+
+        for n in ns: pass
+        self.assertLessEqual(len(ns.page_cache), ns.page_cache.size)
+
+    def test_select(self):
+        q = self.get_query().select("title", "content_length", "updateSequenceNum")
+        self.assertTrue(q.spec.includeContentLength)
+        self.assertTrue(q.spec.includeUpdateSequenceNum)
+        self.assertIsNone(q.spec.includeCreated)
+        self.assertEqual(
+            set(["guid", "title", "contentLength", "updateSequenceNum"]),
+            q.get_fields()
+        )
+
+        n = q.one()
+        self.assertTrue(n.content_length > 0)
+        self.assertFalse(n._hydrated)
+
+        with self.assertRaises(ValueError):
+            self.get_query().select("foo")
+
+    def test_result_cache(self):
+        size = result_cache.size
+        result_cache.size = 10
+        try:
+            result_cache.clear()
+            q = self.get_query().limit(5)
+            key = q._get_result_key(0, 5)
+            self.assertEqual(key, self.get_query().limit(5)._get_result_key(0, 5))
+            self.assertNotEqual(key, self.get_query().limit(5).in_title("foo")._get_result_key(0, 5))
+
+            ns = q.get()
+            self.assertEqual(1, len(result_cache))
+
+            ns2 = self.get_query().limit(5).get()
+            self.assertEqual([n.guid for n in ns], [n.guid for n in ns2])
+            self.assertEqual(1, len(result_cache))
+
+            # saving through enno throws the cached results away
+            n = ns2[0]
+            n.save()
+            self.assertEqual(0, len(result_cache))
+
+        finally:
+            result_cache.size = size
+            result_cache.clear()
+
+    def test_resolve(self):
+        ns = self.get_query().limit(20).get().resolve()
+        for n in ns:
+            self.assertEqual(n.notebook_guid, n.notebook.guid)
+            self.assertEqual(set(n.tag_guids or []), set(t.guid for t in n.tags))
+
+        # the same instance should be shared across notes
+        nbs = {}
+        for n in ns:
+            nb = nbs.setdefault(n.notebook.guid, n.notebook)
+            self.assertTrue(nb is n.notebook)
+
+    def test_hydrate(self):
+        ns = self.get_query().limit(10).get().hydrate(workers=4)
+        for n in ns:
+            self.assertIsNotNone(n.struct.content)
+            self.assertTrue(n.plain)
+
+    def test_stream(self):
+        guids = [n.guid for n in self.get_query().all()]
+        guids2 = [n.guid for n in self.get_query().stream()]
+        self.assertEqual(guids, guids2)
+
+        guids2 = [n.guid for n in self.get_query().stream(prefetch=2)]
+        self.assertEqual(guids, guids2)
+
+        guids2 = [n.guid for n in self.get_query().offset(10).stream()]
+        self.assertEqual(guids[10:], guids2)
+
     def test_all___getitem__(self):
         ns = self.get_query().all()
         count = self.get_query().count()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from unittest import TestCase
+import datetime
+import calendar
+
+import testdata
+from evernote.edam.type.ttypes import \
+    Notebook as EvernoteNotebook, \
+    Note as EvernoteNote, \
+    Tag as EvernoteTag
+
+from enno.model import Note
+from enno.mirror import Mirror
+from enno.search import parse, parse_date, Predicate
+from enno.utils import Plain
+
+
+class SearchTest(TestCase):
+    def get_timestamp(self, dt):
+        return calendar.timegm(dt.utctimetuple()) * 1000
+
+    def get_note(self, title, content, **kwargs):
+        return EvernoteNote(
+            guid=testdata.get_uuid(),
+            title=title,
+            content=Plain(content).enml(),
+            **kwargs
+        )
+
+    def test_parse(self):
+        terms = parse('foo -intitle:"bar che" any: http://example.com created:day-1')
+        self.assertEqual(
+            '[foo, -intitle:"bar che", any:, http://example.com, created:day-1]',
+            str(terms)
+        )
+
+    def test_parse_date(self):
+        now = datetime.datetime(2017, 3, 15, 10) # a wednesday
+        self.assertEqual(datetime.datetime(2017, 3, 14), parse_date("day-1", now))
+        self.assertEqual(datetime.datetime(2017, 3, 12), parse_date("week", now))
+        self.assertEqual(datetime.datetime(2016, 12, 1), parse_date("month-3", now))
+        self.assertEqual(datetime.datetime(2017, 1, 2, 3, 4, 5), parse_date("20170102T030405Z"))
+
+    def test_predicate_words(self):
+        n = self.get_note("Foo bar", "one two three, four")
+
+        self.assertTrue(Predicate("foo")(n))
+        self.assertTrue(Predicate("ONE")(n))
+        self.assertFalse(Predicate("on")(n))
+        self.assertTrue(Predicate("on*")(n))
+        self.assertTrue(Predicate('"two three"')(n))
+        self.assertTrue(Predicate('"three fo*"')(n))
+        self.assertFalse(Predicate('"three two"')(n))
+        self.assertTrue(Predicate("intitle:bar")(n))
+        self.assertFalse(Predicate("intitle:one")(n))
+        self.assertFalse(Predicate("-one")(n))
+        self.assertTrue(Predicate("-intitle:one")(n))
+        self.assertFalse(Predicate("one five")(n))
+        self.assertTrue(Predicate("any: one five")(n))
+        self.assertTrue(Predicate("one any:five any:four")(n))
+        self.assertFalse(Predicate("one any:five any:six")(n))
+
+        with self.assertRaises(ValueError):
+            Predicate("foo")(EvernoteNote(guid=testdata.get_uuid(), title="bar"))
+
+    def test_predicate_dates(self):
+        now = datetime.datetime(2017, 3, 15, 10)
+        n = self.get_note(
+            "foo",
+            "bar",
+            created=self.get_timestamp(datetime.datetime(2017, 3, 10)),
+            updated=self.get_timestamp(datetime.datetime(2017, 3, 14, 12)),
+        )
+
+        self.assertTrue(Predicate("updated:day-1", now=now)(n))
+        self.assertFalse(Predicate("updated:day", now=now)(n))
+        self.assertTrue(Predicate("-updated:day", now=now)(n))
+        self.assertFalse(Predicate("created:week", now=now)(n))
+        self.assertTrue(Predicate("created:20170310", now=now)(n))
+        self.assertTrue(Predicate("-created:20170311", now=now)(n))
+
+    def test_predicate_names(self):
+        n = self.get_note("foo", "bar", notebookGuid="nb1", tagGuids=["t1", "t2"])
+        notebooks = {"nb1": "Work", "nb2": "Home"}
+        tags = {"t1": "Todo", "t2": "urgent", "t3": "later"}
+
+        self.assertTrue(Predicate("notebook:work", notebooks=notebooks)(n))
+        self.assertFalse(Predicate("notebook:home", notebooks=notebooks)(n))
+        self.assertTrue(Predicate("tag:urgent tag:todo", tags=tags)(n))
+        self.assertTrue(Predicate("tag:urg*", tags=tags)(n))
+        self.assertFalse(Predicate("tag:later", tags=tags)(n))
+        self.assertTrue(Predicate("-tag:later", tags=tags)(n))
+
+        with self.assertRaises(ValueError):
+            Predicate("tag:urgent")
+
+    def test_query_compile(self):
+        m = Mirror(testdata.get_file("enno.sqlite"))
+        nbs = [
+            EvernoteNotebook(guid=testdata.get_uuid(), name="nb {}".format(i))
+            for i in range(2)
+        ]
+        m.save_notebooks(nbs)
+
+        notes = [
+            self.get_note(
+                "title {}{}".format(i, " foo" if i % 2 else ""),
+                "content {} bar".format(i),
+                notebookGuid=nbs[i % 2].guid,
+                active=i != 0,
+            )
+            for i in range(10)
+        ]
+
+        q = Note.query.use(m).in_title("foo")
+        self.assertEqual(notes[1::2], list(q.matching(notes)))
+
+        q = Note.query.use(m).nin_note("bar")
+        self.assertEqual([], list(q.matching(notes)))
+
+        q = Note.query.use(m).search('notebook:"nb 0"')
+        self.assertEqual(notes[2::2], list(q.matching(notes)))
+
+        q = Note.query.use(m).is_notebook(nbs[1]).nin_title("foo")
+        self.assertEqual([], list(q.matching(notes)))
+
+        q = Note.query.use(m).in_guid(notes[3].guid, notes[4].guid).any_note("3", "4", "5")
+        self.assertEqual(notes[3:5], list(q.matching(notes)))
+
+        q = Note.query.use(m).in_note("content")
+        self.assertTrue(q.matches(Note(notes[1])))
+        self.assertFalse(q.matches(notes[0]))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, division, print_function, absolute_import
+from unittest import TestCase
+
+import testdata
+
+from enno.model import Note
+from enno.sync import Sync, Replica
+
+
+class SyncTest(TestCase):
+    def test_run(self):
+        path = testdata.get_file("enno.replica")
+        r = Replica(path)
+        counts = Sync(r).run()
+        self.assertLess(0, r.usn)
+        self.assertLess(0, counts["notebooks"])
+        self.assertEqual(len(r.notes), counts["notes"])
+
+        # nothing changed so nothing should be pulled
+        r = Replica(path)
+        counts = Sync(r).run()
+        self.assertEqual(0, sum(counts.values()))
+
+        n = Note()
+        n.title = testdata.get_words()
+        n.plain = testdata.get_words()
+        n.save()
+
+        usn = r.usn
+        counts = Sync(r, content=True).run()
+        self.assertEqual(1, counts["notes"])
+        self.assertLess(usn, r.usn)
+        self.assertEqual(n.title, r.notes[n.guid].title)
+        self.assertEqual(n.content, r.notes[n.guid].content)
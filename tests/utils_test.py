@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, division, print_function, absolute_import
 from unittest import TestCase
+import sys
+import io
+import os
+from multiprocessing import Pool
 
 import testdata
 #from bs4.element import Tag, NavigableString
 
-from enno.utils import HTML, Plain, ENML, Tree
+from enno.compat import unicode
+from enno.utils import HTML, Plain, ENML, Tree, Sanitizer, get_parser, convert, convert_many, iter_lines
+from enno import utils
 
 
 class TreeTest(TestCase):
@@ -42,6 +48,26 @@ and they lived at the bottom of a well.
         t = Tree(ENML(enml_doc).soup)
         self.assertEqual(3, t.plain().count("\n"))
 
+    def test_deep(self):
+        depth = sys.getrecursionlimit() + 100
+        html_doc = "{}<span>foo  bar</span>{}".format("<div>" * depth, "</div>" * depth)
+        t = Tree(HTML(html_doc).soup)
+        tags = [tag for tag in t.tags() if tag.name in set(["div", "span"])]
+        self.assertEqual(depth + 1, len(tags))
+        self.assertEqual("foo bar" + ("\n" * depth), t.plain())
+
+    def test_tags_changed(self):
+        """tags that are unwrapped or removed while iterating don't hide the tags
+        that come after them"""
+        r = HTML("<p>a<custom><custom2><span onclick='x'>deep</span></custom2></custom></p>").enml(pretty=False)
+        self.assertTrue(r.endswith("<en-note><p>a<span>deep</span></p></en-note>"))
+
+        r = HTML("<div><foo><span class='x'>y</span></foo></div>").enml(pretty=False)
+        self.assertTrue(r.endswith("<en-note><div><span>y</span></div></en-note>"))
+
+        r = HTML("<div><script>x</script><span class='x'>y</span><form>z</form><b id='q'>w</b></div>").enml(pretty=False)
+        self.assertTrue(r.endswith("<en-note><div><span>y</span><b>w</b></div></en-note>"))
+
     def test_plain(self):
         html_doc = "\n".join([
             '<p> 1 2 3 </p>',
@@ -236,6 +262,41 @@ and they lived at the bottom of a well.</p>
         # if this doesn't fail with a unicode exception then the test passed
         s = Plain(testdata.get_unicode_words())
 
+    def test_plain_escape(self):
+        s = Plain("1 < 2 & 3 > 2\n<b>foo</b>")
+        r = s.enml()
+        self.assertTrue("<div>1 &lt; 2 &amp; 3 &gt; 2</div>" in r)
+        self.assertTrue("<div>&lt;b&gt;foo&lt;/b&gt;</div>" in r)
+        self.assertEqual(s.splitlines(), r.plain().splitlines())
+        self.assertEqual("<p>1 &lt; 2 &amp; 3 &gt; 2</p>\n<p>&lt;b&gt;foo&lt;/b&gt;</p>", s.html())
+
+    def test_iter_lines(self):
+        s = "1\r\n2\r\n\n3\r4"
+        self.assertEqual(s.splitlines(), list(iter_lines(s)))
+        self.assertEqual(s.splitlines(), list(iter_lines(["1\r", "\n2\r\n", "\n3\r", "4"])))
+        self.assertEqual(["foo", "bar"], list(iter_lines(io.StringIO("foo\nbar\n"))))
+        self.assertEqual(["\u00e9"], list(iter_lines([b"\xc3", b"\xa9"])))
+        self.assertEqual([], list(iter_lines("")))
+
+    def test_plain_write(self):
+        s = "\n".join("line {} <{}> &".format(i, i) for i in range(100)) + "\n\n \n"
+        path = os.path.join(testdata.create_dir(), "foo.log")
+        with io.open(path, "w", encoding="utf-8") as fp:
+            fp.write(s)
+
+        with io.open(path, encoding="utf-8") as src:
+            fp = io.StringIO()
+            Plain.write(fp, src)
+        self.assertEqual(Plain(s).enml(), fp.getvalue())
+
+        with io.open(path, "rb") as src:
+            fp = io.BytesIO()
+            Plain.write(fp, src, to="html")
+        self.assertEqual(Plain(s).html().encode("utf-8"), fp.getvalue())
+
+        with self.assertRaises(ValueError):
+            Plain.write(io.StringIO(), s, to="plain")
+
     def test_enml(self):
         s = self.get_html()
         r = s.enml()
@@ -243,6 +304,141 @@ and they lived at the bottom of a well.</p>
         self.assertFalse("class=" in r)
         self.assertFalse("id=" in r)
 
+    def test_enml_compact(self):
+        s = self.get_html()
+        pretty = s.enml()
+        compact = s.enml(pretty=False)
+        self.assertTrue(len(compact) < len(pretty))
+        self.assertTrue('<a href="http://example.com/elsie">Elsie</a>' in compact)
+        self.assertEqual("".join(pretty.plain().split()), "".join(compact.plain().split()))
+
+        h = compact.html(pretty=False)
+        self.assertTrue(h.startswith("<p><b>The Dormouse's story</b></p>"))
+        self.assertFalse("en-note" in h)
+        self.assertEqual("".join(h.split()), "".join(pretty.html().split()))
+
+    def test_sanitize(self):
+        s = self.get_html()
+        r = s.sanitize()
+        self.assertTrue(isinstance(r, ENML))
+        self.assertTrue("<en-note>" in r)
+        self.assertFalse("class=" in r)
+        self.assertFalse("id=" in r)
+        self.assertFalse("<title>" in r)
+        self.assertTrue('<a href="http://example.com/elsie">Elsie</a>' in r)
+        self.assertEqual("".join(s.enml().plain().split()), "".join(r.plain().split()))
+
+        r = HTML('<p onclick="x">1 &amp; 2<br><script>alert(1)</script><foo>3</foo><b>4').sanitize()
+        self.assertTrue(r.endswith("<en-note><p>1 &amp; 2<br/>3<b>4</b></p></en-note>"))
+
+        r = HTML('<input name="foo"><form><p>1</p></form><p>2</p>').sanitize()
+        self.assertTrue(r.endswith("<en-note><p>2</p></en-note>"))
+
+    def test_sanitize_stream(self):
+        html_doc = '<div class="foo"><p>1 <b>2</b></p>' * 100 + "</div>" * 100
+        pieces = []
+        s = Sanitizer(pieces.append)
+        for i in range(0, len(html_doc), 7):
+            s.feed(html_doc[i:i + 7])
+        self.assertIsNone(s.close())
+        self.assertEqual(HTML(html_doc).sanitize(), "".join(pieces))
+
+    def test_convert_many(self):
+        docs = [Plain("{} foo & bar".format(i)).enml() for i in range(20)]
+        plains = list(convert_many(docs))
+        self.assertEqual("0 foo & bar", plains[0].strip())
+        self.assertEqual(plains, list(convert_many(docs, workers=2)))
+        self.assertEqual(plains, list(convert_many([unicode(d) for d in docs], workers=3, chunksize=2)))
+
+        htmls = list(convert_many(docs, to="html", workers=2))
+        self.assertTrue(isinstance(htmls[0], HTML))
+        self.assertEqual(convert(docs[5], "html"), htmls[5])
+
+        enmls = list(convert_many([self.get_html()], to="enml", workers=2))
+        self.assertTrue(isinstance(enmls[0], ENML))
+        self.assertEqual(self.get_html().enml(), enmls[0])
+
+        with self.assertRaises(ValueError):
+            list(convert_many(docs, to="foo"))
+
+    def test_convert_many_types(self):
+        docs = [HTML("<p>{} foo</p>".format(i)) for i in range(4)]
+        for to in ["plain", "html", "enml"]:
+            local = list(convert_many(docs, to=to))
+            remote = list(convert_many(docs, to=to, workers=2))
+            self.assertEqual(local, remote)
+            self.assertEqual([type(d) for d in local], [type(d) for d in remote])
+            self.assertTrue(isinstance(local[0], utils.CONVERT_TYPES[to]))
+
+        self.assertTrue(isinstance(convert(docs[0]), Plain))
+
+    def test_convert_many_pool(self):
+        docs = [Plain("{} foo".format(i)).enml() for i in range(10)]
+        plains = list(convert_many(docs))
+
+        # the workers are started once and kept for the next call
+        self.assertEqual(plains, list(convert_many(docs, workers=2)))
+        pool = utils.get_pool(2)
+        self.assertEqual(plains, list(convert_many(docs, workers=2)))
+        self.assertTrue(pool is utils.get_pool(2))
+
+        pool = Pool(2)
+        try:
+            self.assertEqual(plains, list(convert_many(docs, pool=pool)))
+            # the caller's pool is left running
+            self.assertEqual(plains, list(convert_many(docs, pool=pool, chunksize=3)))
+
+        finally:
+            pool.terminate()
+
+    def test_conversion_cache(self):
+        calls = []
+        tree_plain = Tree.plain
+        def plain(self):
+            calls.append(1)
+            return tree_plain(self)
+        Tree.plain = plain
+
+        size = utils.conversion_cache.size
+        path = utils.conversion_cache.path
+        utils.conversion_cache.size = 10
+        utils.conversion_cache.path = ""
+        try:
+            s = self.get_html().enml()
+            p = ENML(s).plain()
+            self.assertEqual(p, ENML(s).plain())
+            self.assertEqual(1, len(calls))
+
+            # the same markup as a different type is a different conversion
+            HTML(s).plain()
+            self.assertEqual(2, len(calls))
+
+            if get_parser("lxml") == "lxml":
+                # a different parser could convert it differently
+                for parser in ["lxml", "html.parser", "html.parser"]:
+                    e = ENML(s)
+                    e.parser = parser
+                    self.assertEqual(p, e.plain())
+                calls.pop()
+                self.assertEqual(2, len(calls))
+
+            h = ENML(s).html(pretty=False)
+            self.assertTrue(isinstance(h, HTML))
+            self.assertIsNot(h, ENML(s).html(pretty=False))
+            self.assertEqual(h, ENML(s).html(pretty=False))
+            self.assertNotEqual(h, ENML(s).html())
+
+            # the cache is off
+            utils.conversion_cache.size = 0
+            ENML(s).plain()
+            self.assertEqual(3, len(calls))
+
+        finally:
+            Tree.plain = tree_plain
+            utils.conversion_cache.clear()
+            utils.conversion_cache.size = size
+            utils.conversion_cache.path = path
+
     def test_closing_tag(self):
         html_doc = "<p>1</p><hr><br><p>2</p>"
         s = HTML(html_doc)
@@ -260,6 +456,22 @@ and they lived at the bottom of a well.</p>
         self.assertFalse("<?xml" in r)
         self.assertFalse("<!DOCTYPE" in r)
 
+    def test_soup_cache(self):
+        s = self.get_html()
+        soup = s.soup
+        self.assertIs(soup, s.soup)
+        p = s.plain()
+        self.assertIs(soup, s.soup)
+
+        s.release()
+        self.assertIsNot(soup, s.soup)
+
+        # enml() changes the tree so it can't be used again
+        soup = s.soup
+        s.enml()
+        self.assertIsNot(soup, s.soup)
+        self.assertEqual(p, s.plain())
+
     def test_enml_to_plain(self):
         enml_doc = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
 <!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">
@@ -312,3 +524,77 @@ and they lived at the bottom of a well.
         s = HTML(html_doc)
         s.plain()
 
+
+
+class GetParserTest(TestCase):
+    def test_default(self):
+        self.assertEqual("html.parser", get_parser())
+        self.assertEqual("html.parser", get_parser("not-a-parser"))
+        h = HTML("<p>x<p>y")
+        h.parser = ""
+        self.assertEqual("html.parser", h.soup.builder.NAME)
+
+
+def get_parser_docs():
+    """returns notes that look like the notes people actually have"""
+    docs = []
+
+    lines = []
+    for i in range(200):
+        lines.append("{} &amp; {}".format(testdata.get_ascii_words(10), i))
+    docs.append(Plain("\n".join(lines)).enml())
+
+    blocks = []
+    for i in range(100):
+        blocks.append("".join([
+            '<div class="block" id="b{}">'.format(i),
+            '<h2>{}</h2>'.format(testdata.get_ascii_words(3)),
+            '<p>{} <a href="http://example.com/{}" onclick="go()">link</a> '.format(
+                testdata.get_ascii_words(20),
+                i
+            ),
+            '<b>{}</b>, <i>{}</i></p>'.format(
+                testdata.get_ascii_words(2),
+                testdata.get_ascii_words(2),
+            ),
+            '<ul><li>{}</li><li>{}</li></ul>'.format(
+                testdata.get_ascii_words(4),
+                testdata.get_ascii_words(4),
+            ),
+            '<table><tr><td>{}</td><td>{}</td></tr></table>'.format(i, i * 2),
+            '<pre>  {}\n    {}</pre>'.format(
+                testdata.get_ascii_words(3),
+                testdata.get_ascii_words(3),
+            ),
+            '<script>alert({})</script>'.format(i),
+            '</div>',
+        ]))
+    html = HTML("<html><head><title>t</title></head><body>{}</body></html>".format(
+        "\n".join(blocks)
+    ))
+    docs.append(html)
+    docs.append(html.enml())
+    return docs
+
+
+def convert_with(doc, parser):
+    """returns the plain, enml, and html of doc parsed with parser"""
+    ret = []
+    for method in ["plain", "enml", "html"]:
+        d = type(doc)(doc)
+        d.parser = parser
+        ret.append(getattr(d, method)())
+    return ret
+
+
+class ParserTest(TestCase):
+    def setUp(self):
+        if get_parser("lxml") != "lxml":
+            self.skipTest("lxml is not installed")
+
+    def test_same_output(self):
+        for doc in get_parser_docs():
+            self.assertEqual(
+                convert_with(doc, "html.parser"),
+                convert_with(doc, "lxml")
+            )